@@ -11,15 +11,23 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
 # Internal Imports
-from sensors.sensor_reader import VOCSensor
+from sensors.acquisition import get_acquisition
 from sensors.hand_controller import HandController
-from core.feature_extractor import extract_features
+from core.feature_extractor import feature_dicts, feature_names
+from core.feature_cache import get_feature_cache
+from core.online_features import OnlineFeatureAccumulator
 from database.logger import log_voc as log_voc_encrypted
 from database.logger_simple import log_voc as log_voc_simple
 from database.feature_dao import store_features, store_radar_profile, get_radar_profile, store_feedback
-from database.user_dao import insert_user, get_all_users
-from core.verification_controller import verify_user
-from sensors.fan_manager import get_fan
+from database.user_dao import insert_user
+from database.user_directory import get_user_directory
+from core.verification_controller import verify_user, enroll_embeddings
+from core.sequential import SequentialVerifier, SEQ_ENABLED
+from core.template_matcher import enroll_templates
+from utils.timing import TIMINGS_ENABLED, Timeline, activate, current_timeline, percentiles, span
+from core.warmup import get_warmup, WARMUP_ENABLED, READY, FAILED
+from sensors.flush_controller import get_flush_controller
+from sensors.fan_scheduler import get_fan_scheduler, FLUSHING
 from core.radar_handler import RadarHandler
 from core.data_packager import DataPackager
 
@@ -36,6 +44,8 @@ if SENSOR_MODE == 12:
 SAMPLE_COUNT = 30
 ROUNDS = 50
 SENSOR_NAMES = ["Ethanol", "Methane", "CO2", "Ammonia", "H2S", "Toluene"]
+LATENCY_STAGES = ["sensor.read", "capture", "features", "models.get", "inference", "sequential",
+                  "verify", "users.lookup", "db.store_features", "flush"]
 
 # ─── THEME ────────────────────────────────────────────────────────────────────
 BG_DARK      = "#0D1117"
@@ -186,8 +196,10 @@ class MainGUI(ctk.CTk):
         self.geometry("1280x900")
         self.configure(fg_color=BG_DARK)
 
-        self.sensor = VOCSensor()
+        self.acquisition = get_acquisition()
+        self.sensor = self.acquisition.sensor
         self.hand   = HandController()
+        self.acquisition.start()
         
         self.fp_sensor = None
         if SENSOR_MODE == 12 and FingerprintSensor:
@@ -207,7 +219,11 @@ class MainGUI(ctk.CTk):
         self._build_sidebar()
         self.frame = ctk.CTkFrame(self, fg_color=BG_DARK, corner_radius=0)
         self.frame.pack(side="right", fill="both", expand=True)
-        
+
+        # Load and exercise the models while the user is still on the dashboard
+        if WARMUP_ENABLED:
+            get_warmup().start()
+
         self.show_main_menu()
 
     def _build_sidebar(self):
@@ -229,6 +245,19 @@ class MainGUI(ctk.CTk):
         
         ctk.CTkLabel(side, text=f"Mode: {SENSOR_MODE}-Sensor", font=("Courier New", 10), text_color=TEXT_MUTED).pack(side="bottom", pady=20)
 
+        chamber_l = ctk.CTkLabel(side, text="Chamber: idle", font=("Courier New", 10), text_color=TEXT_MUTED)
+        chamber_l.pack(side="bottom")
+        get_fan_scheduler().on_state_change(
+            lambda state: self.safe_ui(lambda: chamber_l.configure(
+                text=f"Chamber: {state}", text_color=ACCENT if state == FLUSHING else TEXT_MUTED)))
+
+        if WARMUP_ENABLED:
+            models_l = ctk.CTkLabel(side, text="Models: pending", font=("Courier New", 10), text_color=TEXT_MUTED)
+            models_l.pack(side="bottom")
+            get_warmup().on_state_change(lambda w: self.safe_ui(lambda s=w.state: models_l.configure(
+                text=f"Models: {s}" + (f" ({w.total:.1f}s)" if s == READY else ""),
+                text_color=ACCENT2 if s == READY else ACCENT_RED if s == FAILED else ACCENT_WARN)))
+
     def _open_analytics(self):
         VisualizationWindow(self, self._scatter_data, self._radar_data)
 
@@ -269,7 +298,7 @@ class MainGUI(ctk.CTk):
         stats_frame.pack_propagate(False)
         
         try:
-            all_users = get_all_users()
+            all_users = get_user_directory().all_users()
         except:
             all_users = []
             
@@ -289,6 +318,18 @@ class MainGUI(ctk.CTk):
         for uid, name in all_users:
             ctk.CTkLabel(scroll, text=f"• {name}  [{uid}]", font=("Courier New", 11), text_color=TEXT_PRIMARY, anchor="w").pack(fill="x", pady=2)
 
+        # Rolling latency percentiles of the main stages
+        latency = percentiles(LATENCY_STAGES) if TIMINGS_ENABLED else {}
+        if latency:
+            lat_frame = ctk.CTkFrame(outer, fg_color=BG_CARD, border_width=1, border_color=BORDER)
+            lat_frame.pack(fill="x", pady=(20, 0))
+            ctk.CTkLabel(lat_frame, text=f"{'LATENCY (ms)':<16s}{'p50':>9s}{'p95':>9s}{'p99':>9s}{'n':>6s}",
+                         font=("Courier New", 12, "bold"), text_color=ACCENT).pack(anchor="w", padx=15, pady=(10, 2))
+            for stage, p in latency.items():
+                ctk.CTkLabel(lat_frame, text=f"{stage:<16s}{p['p50']:>9.2f}{p['p95']:>9.2f}{p['p99']:>9.2f}{p['n']:>6d}",
+                             font=("Courier New", 11), text_color=TEXT_PRIMARY).pack(anchor="w", padx=15)
+            ctk.CTkLabel(lat_frame, text="").pack(pady=2)
+
     def training_mode(self):
         self.clear()
         ctk.CTkLabel(self.frame, text="Neural Network & Ensemble Training", font=("Courier New", 24, "bold")).pack(pady=20)
@@ -331,6 +372,11 @@ class MainGUI(ctk.CTk):
         log_box.pack(side="right", fill="both", padx=30, pady=30)
 
         def start():
+            # Every span of the session (sensor I/O, features, scoring, lookups, DB) lands in one timeline
+            with activate(Timeline() if TIMINGS_ENABLED else None):
+                run()
+
+        def run():
             self.safe_ui(lambda: log_box.delete("1.0", "end"))
             
             if SENSOR_MODE == 12 and self.fp_sensor:
@@ -345,41 +391,73 @@ class MainGUI(ctk.CTk):
 
             # Pre-check sensor connectivity
             self.safe_ui(lambda: status_l.configure(text="Validating sensors..."))
-            ch_status, _, _ = self.sensor.read_sensors()
+            latest = next(self.acquisition.iter_blocks(1, timeout=5.0), None)
+            ch_status = "ERROR: No samples from acquisition engine" if latest is None else self.sensor.process(latest[1][0])[0]
             if ch_status != "OK":
                 self.safe_ui(lambda: messagebox.showerror("Sensor Error", f"Hardware Feedback: {ch_status}"))
                 self.safe_ui(lambda: status_l.configure(text="Ready"))
                 return
 
+            # The previous session's flush runs in the background; only wait if it is still going
+            fan = get_fan_scheduler()
+            if fan.state == FLUSHING:
+                self.safe_ui(lambda: status_l.configure(text="Flushing chamber..."))
+                with span("flush.wait"):
+                    fan.wait_until_clean()
+
+            # Idle chamber before the first hand is the initial clean-air reference for flushing
+            get_flush_controller().ensure_baseline()
+
             self.safe_ui(lambda: status_l.configure(text="Waiting for hand..."))
-            while not self.hand.hand_present(): time.sleep(0.1)
+            with span("hand.wait"):
+                self.hand.wait_for_hand()
             
             self.hand.start_sampling()
             all_samples = []
+            # Pauses by itself while the hand is out and drops samples taken without it
+            blocks = self.acquisition.iter_blocks(1, gate=self.hand)
+            on_removed = self.hand.on_hand_removed(
+                lambda: self.safe_ui(lambda: status_l.configure(text="Hand removed! Waiting...")))
             
+            round_features = []
+            # Chunk features computed here are reused by verification and the feedback buttons
+            cache = get_feature_cache()
+            session_id = cache.new_session(feature_names(self.acquisition.labels))
+            # Verification scores each round as it completes and stops once the decision is clear
+            seq = SequentialVerifier(ROUNDS) if mode != "registration" and SEQ_ENABLED else None
+            timeline = current_timeline()
             for r in range(1, ROUNDS + 1):
-                samples = []
+                if timeline is not None:
+                    timeline.next_round(r)
+                # Features accumulate sample by sample; no per-round buffer
+                acc = OnlineFeatureAccumulator(self.acquisition.labels)
                 for s in range(SAMPLE_COUNT):
-                    # Check if hand is still present during sampling
-                    if not self.hand.hand_present():
-                        self.safe_ui(lambda: status_l.configure(text="Hand removed! Waiting..."))
-                        while not self.hand.hand_present(): time.sleep(0.2)
-                        
                     self.safe_ui(lambda v=(len(all_samples)/(ROUNDS*SAMPLE_COUNT)), r=r, s=s: 
                                  [prog.set(v), status_l.configure(text=f"Scanning Round {r}/{ROUNDS} - Sample {s+1}/{SAMPLE_COUNT}")])
                     
-                    res, voc, _ = self.sensor.read_sensors()
+                    # Paced by the acquisition thread (SAMPLE_RATE_HZ) instead of a sleep
+                    with span("capture"):
+                        _, values = next(blocks)
+                        res, voc, _ = self.sensor.process(values[0])
                     if res == "OK": 
-                        samples.append(voc)
+                        with span("features"):
+                            acc.add(voc)
                         all_samples.append(voc)
-                    time.sleep(0.2)
                 
-                if len(samples) > 0:
-                    features = extract_features(samples)
+                if len(acc) > 0:
+                    with span("features"):
+                        vector = acc.snapshot()
+                        cache.put(session_id, len(round_features), vector)
+                    features = dict(zip(acc.names, vector.tolist()))
+                    round_features.append(features)
                     if mode=="registration": store_features(uid, features, r)
+                    elif seq is not None and seq.add_round(features) != "continue":
+                        self.safe_ui(lambda r=r, d=seq.decision: status_l.configure(text=f"Early {d} after round {r}/{ROUNDS}"))
+                        break
                 else:
                     self.safe_ui(lambda: messagebox.showerror("Read Error", f"Round {r} collected no valid readings. Retrying..."))
             
+            self.hand.remove_callback(on_removed)
             self.hand.stop_sampling()
             
             if len(all_samples) == 0:
@@ -390,21 +468,33 @@ class MainGUI(ctk.CTk):
             if mode=="registration":
                 # Store user name in users table (critical for verification name lookup)
                 insert_user(uid, uname)
+                enroll_embeddings(uid, round_features)
+                enroll_templates(uid, round_features)
                 log_voc_simple("REGISTRATION", uname, uid, all_samples)
                 RadarHandler().generate_radar_plot(uid, np.mean([list(s.values()) for s in all_samples], axis=0), uname)
                 self.safe_ui(lambda: status_l.configure(text="Registration Packaged!"))
                 self.safe_ui(lambda: messagebox.showinfo("Success", "Registration packaged!"))
             else:
                 self.safe_ui(lambda: status_l.configure(text="Processing Verification..."))
-                chunks = [extract_features(all_samples[i:i+SAMPLE_COUNT]) for i in range(0, len(all_samples), SAMPLE_COUNT) if len(all_samples[i:i+SAMPLE_COUNT]) > 0]
-                result = verify_user(chunks)
-                self._show_ver_result(result, all_samples, log_box)
+                result = seq.finish() if seq is not None else verify_user(round_features)
+                self._show_ver_result(result, session_id, all_samples, round_features, log_box)
                 self.safe_ui(lambda: status_l.configure(text="Verification Complete!"))
 
         ctk.CTkButton(left, text="BEGIN", height=50, width=340, fg_color=t_clr, text_color=BG_DARK, 
                       command=lambda: threading.Thread(target=start, daemon=True).start()).pack(pady=20)
 
-    def _show_ver_result(self, result, samples, log_box):
+    def _session_features(self, session_id, round_features):
+        """
+        Feature dicts of every round of a capture session, from the cache or,
+        once evicted, the session's own round dicts: the vectors that were
+        scored, never a recomputation.
+        """
+        cached = get_feature_cache().get_matrix(session_id)
+        if cached is None:
+            return round_features
+        return feature_dicts(*cached)
+
+    def _show_ver_result(self, result, session_id, samples, round_features, log_box):
         # ── Print per-model predictions per round ──
         def _render_results():
             log_box.insert("end", "\n" + "═"*60 + "\n")
@@ -413,7 +503,8 @@ class MainGUI(ctk.CTk):
             
             round_details = result.get('round_details', [])
             for rd in round_details:
-                log_box.insert("end", f"── Round {rd['round']} ──\n")
+                stage = f" [{rd['stage']}]" if rd.get('stage') else ""
+                log_box.insert("end", f"── Round {rd['round']}{stage} ──\n")
                 for model_name, vote in rd['votes'].items():
                     log_box.insert("end", f"  {model_name:>4s}: {vote['user_name']}  [{vote['confidence']}%]\n")
                 log_box.insert("end", "\n")
@@ -424,14 +515,24 @@ class MainGUI(ctk.CTk):
             log_box.insert("end", f" Name : {result['user_name']}\n")
             log_box.insert("end", f" ID   : {result['user_id']}\n")
             log_box.insert("end", f" Score: {result['confidence']}%\n")
+            if result.get("method") in ("embedding", "template"):
+                log_box.insert("end", f" Match: {result['method']} (user not in trained models)\n")
+            if result.get("neighbours"):
+                nearest = ", ".join(f"{n['user_name']} ({n['distance']:.2f})" for n in result["neighbours"][:3])
+                log_box.insert("end", f" Nearest: {nearest}\n")
+            timings = result.get("timings")
+            if timings:
+                log_box.insert("end", f" Timings (total {timings['total'] / 1000:.1f}s):\n")
+                for stage, ms in sorted(timings["stages"].items(), key=lambda kv: -kv[1]):
+                    log_box.insert("end", f"  {stage:<22s}{ms:>10.1f} ms\n")
+                if timings["models"]:
+                    models = "  ".join(f"{name} {ms:.1f}" for name, ms in timings["models"].items())
+                    log_box.insert("end", f"  per model (ms): {models}\n")
             log_box.insert("end", "═"*60 + "\n")
             log_box.see("end")
         
         self.safe_ui(_render_results)
         
-        if result['status'] == "VERIFIED":
-            threading.Thread(target=get_fan().flush, args=(20,), daemon=True).start()
-        
         # Build Radar Data for Analytics
         v_means = np.mean([list(s.values()) for s in samples], axis=0)
         try:
@@ -486,17 +587,14 @@ class MainGUI(ctk.CTk):
             ann_confidence = float(result.get('confidence', 0.0))
             
             # Store features under the correct user ID for reinforcement and into the replay buffer
-            for i in range(ROUNDS):
-                chunk = samples[i*SAMPLE_COUNT:(i+1)*SAMPLE_COUNT]
-                if len(chunk) > 0:
-                    features_dict = extract_features(chunk)
-                    # Reward is -1 because the prediction was incorrect
-                    store_feedback(user_id=correct_id, 
-                                   predicted_id=ann_predicted_id, 
-                                   predicted_name=ann_predicted_name, 
-                                   confidence=ann_confidence, 
-                                   reward=-1, 
-                                   feature_dict=features_dict)
+            for features_dict in self._session_features(session_id, round_features):
+                # Reward is -1 because the prediction was incorrect
+                store_feedback(user_id=correct_id, 
+                               predicted_id=ann_predicted_id, 
+                               predicted_name=ann_predicted_name, 
+                               confidence=ann_confidence, 
+                               reward=-1, 
+                               feature_dict=features_dict)
             
             self.stats["flagged"] += 1
             
@@ -511,7 +609,7 @@ class MainGUI(ctk.CTk):
         # ── Select Actual Person / Positive Reinforcement Button ──
         def select_actual_person():
             try:
-                all_users = get_all_users()
+                all_users = get_user_directory().all_users()
             except:
                 all_users = []
                 
@@ -545,17 +643,13 @@ class MainGUI(ctk.CTk):
             rl_reward = 1 if ann_predicted_id == actual_id else -1
             
             # Store features into the replay buffer as manually validated ground-truth
-            for i in range(ROUNDS):
-                chunk = samples[i*SAMPLE_COUNT:(i+1)*SAMPLE_COUNT]
-                if len(chunk) > 0:
-                    features_dict = extract_features(chunk)
-                    
-                    store_feedback(user_id=actual_id, 
-                                   predicted_id=ann_predicted_id, 
-                                   predicted_name=ann_predicted_name, 
-                                   confidence=ann_confidence, 
-                                   reward=rl_reward, 
-                                   feature_dict=features_dict)
+            for features_dict in self._session_features(session_id, round_features):
+                store_feedback(user_id=actual_id, 
+                               predicted_id=ann_predicted_id, 
+                               predicted_name=ann_predicted_name, 
+                               confidence=ann_confidence, 
+                               reward=rl_reward, 
+                               feature_dict=features_dict)
             
             self.stats["flagged"] += 1
             reward_str = "POSITIVE (+1)" if rl_reward == 1 else "NEGATIVE (-1)"
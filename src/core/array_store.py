@@ -0,0 +1,77 @@
+"""
+Memory-mapped .npz archives for exported model weights.
+
+np.load() ignores mmap_mode for .npz files and reads every member into
+RAM. Archives written by save_arrays() are uncompressed (ZIP_STORED), so
+each member's .npy payload sits contiguously in the file; load_arrays()
+finds its offset in the zip directory and maps it with np.memmap. Opening
+a model is then a handful of header reads, and pages are only faulted in
+when inference touches them.
+"""
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")   # zip local file header, 30 bytes
+_LOCAL_MAGIC = b"PK\x03\x04"
+
+
+def save_arrays(path, **arrays):
+    """Write arrays as an uncompressed .npz (atomically, so readers never see a partial file)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def _member_offset(f, info):
+    """Byte offset of a stored member's data, past its local header."""
+    f.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+    if header[0] != _LOCAL_MAGIC:
+        raise ValueError(f"Bad zip local header for {info.filename}")
+    name_len, extra_len = header[-2], header[-1]
+    return info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+
+
+def load_arrays(path, mmap=True):
+    """
+    {name: array} from an .npz. With mmap=True every stored (uncompressed)
+    member is a read-only np.memmap; compressed or object members are read
+    normally.
+    """
+    if not mmap:
+        with np.load(path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+
+            f.seek(_member_offset(f, info))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+            if dtype.hasobject:
+                raise ValueError(f"{path}:{name} holds Python objects and cannot be memory-mapped")
+            if not shape or 0 in shape:
+                # Scalars and empty arrays are not worth a mapping
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                     order="F" if fortran else "C")
+    return arrays
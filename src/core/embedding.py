@@ -0,0 +1,215 @@
+"""
+Embedding space for open-set identification.
+
+training/train_all.py fits a linear discriminant projection of the
+standardized feature vector (scaler folded in, like the NumPy ANN) and
+writes it as embedding_model.npz. In that space rounds of the same person
+lie close together, so identification becomes a nearest-neighbour search
+instead of a classification over the users the ensemble was trained on.
+
+Every enrolled round is stored in the embeddings table together with its
+raw feature vector and a hash of the feature order of that vector.
+EmbeddingIndex keeps all of them in a cKDTree and returns the top-k
+distinct users with distances; a new enrollment is added to the index at
+once, without retraining anything. When a retrain changes the projection,
+stored rows are re-projected from their features, but only rows whose
+feature order is the one the projection was trained on (a retrain can
+drop different zero-variance columns and keep the same count); other rows
+are left out of the index.
+"""
+import hashlib
+import os
+import threading
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from core.array_store import load_arrays, save_arrays
+from database.embedding_dao import get_all_embeddings, insert_embeddings, set_feature_layout, update_embeddings
+
+EMBEDDING_FILE = "embedding_model.npz"
+EMBEDDING_DIM = int(os.environ.get("VOC_EMBEDDING_DIM", "16"))     # upper bound; LDA gives at most classes - 1
+EMBEDDING_TOP_K = 5
+RADIUS_PERCENTILE = 95      # of held-out distances to the own class centroid
+
+
+def feature_layout(feature_order):
+    """Short hash identifying a feature order, stored with every embedding row."""
+    if feature_order is None:
+        return None
+    return hashlib.sha1(",".join(feature_order).encode()).hexdigest()[:12]
+
+
+def compile_projection(lda, scaler, n_components):
+    """
+    float32 x @ W + b equal to lda.transform(scaler.transform(x))[:, :n_components]
+    for an LDA fitted with the eigen solver (transform is X @ scalings_).
+    """
+    scalings = np.asarray(lda.scalings_, dtype=np.float64)[:, :n_components]
+    W = scalings / scaler.scale_[:, np.newaxis]
+    b = -(scaler.mean_ / scaler.scale_) @ scalings
+    return np.ascontiguousarray(W, dtype=np.float32), np.ascontiguousarray(b, dtype=np.float32)
+
+
+class EmbeddingModel:
+    """Linear projection of raw feature vectors into the embedding space."""
+
+    def __init__(self, arrays, path=None):
+        self.path = path
+        self.W = arrays["W"]
+        self.b = arrays["b"]
+        self.radius = float(arrays["radius"])       # open-set acceptance distance
+        # Feature columns W expects; None for projections exported before it was stored
+        self.feature_order = [str(f) for f in arrays["order"]] if "order" in arrays else None
+        # Identifies the projection; stored with every embedding so stale rows can be found
+        self.version = hashlib.sha1(np.asarray(self.W).tobytes() + np.asarray(self.b).tobytes()).hexdigest()[:12]
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(load_arrays(path, mmap=mmap), path=str(path))
+
+    @staticmethod
+    def save(path, W, b, radius, feature_order):
+        save_arrays(path, W=W, b=b, radius=np.asarray(float(radius)), order=np.asarray(feature_order, dtype=str))
+
+    @property
+    def layout(self):
+        return feature_layout(self.feature_order)
+
+    @property
+    def n_features(self):
+        return self.W.shape[0]
+
+    @property
+    def dim(self):
+        return self.W.shape[1]
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None]
+        Z = X @ self.W
+        Z += self.b
+        return Z
+
+
+def load_embedding_model(models_dir):
+    path = os.path.join(models_dir, EMBEDDING_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        return EmbeddingModel.load(path)
+    except Exception as e:
+        print(f"[EMBEDDING] Could not load {EMBEDDING_FILE}: {e}")
+        return None
+
+
+# ---------------- INDEX ----------------
+class EmbeddingIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None        # projection the index was built for
+        self._tree = None
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._user_ids = np.empty(0, dtype=object)
+
+    def _load(self, model):
+        """Every stored embedding, re-projecting rows written under another projection."""
+        rows = get_all_embeddings()
+        layout = model.layout
+        # Rows from before layouts were stored: those written under this projection have its layout
+        untagged = [row_id for row_id, _, _, _, projection, row_layout in rows
+                    if row_layout is None and projection == model.version]
+        if untagged and layout is not None:
+            set_feature_layout(untagged, layout)
+            untagged = set(untagged)
+            rows = [row[:5] + (layout,) if row[0] in untagged else row for row in rows]
+
+        stale = [(row_id, features) for row_id, _, _, features, projection, row_layout in rows
+                 if projection != model.version and layout is not None and row_layout == layout]
+        refreshed = {}
+        if stale:
+            Z = model.transform(np.vstack([features for _, features in stale]))
+            refreshed = {row_id: z for (row_id, _), z in zip(stale, Z)}
+            update_embeddings(list(refreshed.items()), model.version)
+            print(f"[EMBEDDING] Re-projected {len(stale)} stored embeddings for projection {model.version}")
+
+        vectors, user_ids, skipped = [], [], 0
+        for row_id, user_id, embedding, _, projection, _ in rows:
+            if row_id in refreshed:
+                embedding = refreshed[row_id]
+            elif projection != model.version:
+                skipped += 1    # features in another (or unknown) order; cannot be re-projected
+                continue
+            vectors.append(embedding)
+            user_ids.append(user_id)
+        if skipped:
+            print(f"[EMBEDDING] Left out {skipped} stored embeddings with a different feature order")
+        return vectors, user_ids
+
+    def _build(self, vectors, user_ids, dim):
+        self._vectors = np.vstack(vectors).astype(np.float32) if vectors else np.empty((0, dim), np.float32)
+        self._user_ids = np.asarray(user_ids, dtype=object)
+        self._tree = cKDTree(self._vectors) if len(self._vectors) else None
+
+    def ensure(self, model):
+        """(Re)build the index for `model`'s projection if it was built for another one."""
+        if self._version == model.version:
+            return
+        with self._lock:
+            if self._version != model.version:
+                self._build(*self._load(model), model.dim)
+                self._version = model.version
+
+    def add(self, user_id, embeddings, model):
+        """Make freshly enrolled embeddings searchable at once."""
+        self.ensure(model)
+        with self._lock:
+            self._build(list(self._vectors) + list(np.atleast_2d(embeddings)),
+                        list(self._user_ids) + [user_id] * len(np.atleast_2d(embeddings)), model.dim)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def query(self, embedding, model, k=EMBEDDING_TOP_K):
+        """Top-k distinct users nearest to `embedding`: [(user_id, distance), ...], closest first."""
+        self.ensure(model)
+        tree, user_ids = self._tree, self._user_ids
+        if tree is None:
+            return []
+
+        n = len(user_ids)
+        neighbours = min(n, k * 4)
+        while True:
+            dist, idx = tree.query(np.asarray(embedding, dtype=np.float32), k=neighbours)
+            dist, idx = np.atleast_1d(dist), np.atleast_1d(idx)
+            best = {}
+            for d, i in zip(dist, idx):
+                best.setdefault(user_ids[i], float(d))
+            # Several rows per user: widen the search until k users are found or all rows are seen
+            if len(best) >= k or neighbours == n:
+                return list(best.items())[:k]
+            neighbours = min(n, neighbours * 2)
+
+
+_index_instance = None
+
+
+def get_embedding_index():
+    global _index_instance
+
+    if _index_instance is None:
+        _index_instance = EmbeddingIndex()
+
+    return _index_instance
+
+
+def enroll(user_id, X, model):
+    """Project and store the rounds of a new user and add them to the index. Returns the embeddings."""
+    index = get_embedding_index()
+    index.ensure(model)         # built before the insert, so the new rows are not loaded twice
+    Z = model.transform(X)
+    insert_embeddings(user_id, Z, np.asarray(X, dtype=np.float32), model.version, model.layout)
+    index.add(user_id, Z, model)
+    return Z
@@ -0,0 +1,138 @@
+"""
+Concurrent dispatch of the ensemble members.
+
+The five predict_proba calls are independent, and sklearn's tree code,
+XGBoost, onnxruntime and BLAS all release the GIL, so on the Pi's four
+cores they can run side by side on a small thread pool. While they do,
+threadpoolctl caps each library's own BLAS/OpenMP pool (ENSEMBLE_INNER_THREADS)
+so the members do not oversubscribe the cores between them. threadpoolctl
+does not reach joblib: a pickled forest trained with n_jobs=-1 would still
+start a worker per core inside each member, so the registry pins the
+pickled members' n_jobs with pin_member_jobs() when they may run in parallel.
+
+Whether that pays depends on the batch: for a single round the members
+finish in well under a millisecond each and the hand-off costs more than
+it saves. The executor therefore times both modes per batch-size bucket
+(rows rounded up to a power of two), tries each a few times, then keeps
+using the faster one, re-checking now and then. With one core, or
+VOC_ENSEMBLE_THREADS=1, it always runs serially.
+
+run() returns the member outputs and each member's wall time in ms.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ENSEMBLE_THREADS = int(os.environ.get("VOC_ENSEMBLE_THREADS", str(min(4, os.cpu_count() or 1))))
+ENSEMBLE_INNER_THREADS = 1      # BLAS/OpenMP threads per member while members run in parallel
+
+SERIAL = "serial"
+PARALLEL = "parallel"
+TRIALS = 3                  # timed runs per mode and bucket before choosing
+RECHECK_EVERY = 200         # calls per bucket between re-timing the slower mode
+EWMA_WEIGHT = 0.2
+
+
+def pin_member_jobs(models, n_jobs=ENSEMBLE_INNER_THREADS):
+    """Set n_jobs on every model in `models` that has it (sklearn forests, XGBoost). Returns their keys."""
+    pinned = []
+    for key, model in models.items():
+        get_params = getattr(model, "get_params", None)
+        if get_params is not None and "n_jobs" in get_params(deep=False):
+            model.set_params(n_jobs=n_jobs)
+            pinned.append(key)
+    return pinned
+
+
+class EnsembleExecutor:
+
+    def __init__(self, threads=ENSEMBLE_THREADS, inner_threads=ENSEMBLE_INNER_THREADS):
+        self.threads = max(1, int(threads))
+        self.inner_threads = inner_threads
+        self._pool = None
+        self._controller = None
+        self._lock = threading.Lock()
+        self._stats = {}            # bucket -> {"calls": n, SERIAL: (runs, ewma ms), PARALLEL: (...)}
+
+    # ---------------- MODE SELECTION ----------------
+    @staticmethod
+    def _bucket(rows):
+        return max(1, int(rows) - 1).bit_length()
+
+    def choose_mode(self, rows):
+        if self.threads == 1:
+            return SERIAL
+        with self._lock:
+            stats = self._stats.setdefault(self._bucket(rows), {"calls": 0, SERIAL: (0, 0.0), PARALLEL: (0, 0.0)})
+            stats["calls"] += 1
+            for mode in (SERIAL, PARALLEL):
+                if stats[mode][0] < TRIALS:
+                    return mode
+            faster, slower = sorted((SERIAL, PARALLEL), key=lambda m: stats[m][1])
+            return slower if stats["calls"] % RECHECK_EVERY == 0 else faster
+
+    def _record(self, rows, mode, elapsed_ms):
+        with self._lock:
+            stats = self._stats.get(self._bucket(rows))
+            if stats is None:
+                return
+            runs, avg = stats[mode]
+            avg = elapsed_ms if runs == 0 else (1 - EWMA_WEIGHT) * avg + EWMA_WEIGHT * elapsed_ms
+            stats[mode] = (runs + 1, avg)
+
+    def stats(self):
+        """{rows up to: {mode: average ms}} of the timings behind the current choices."""
+        with self._lock:
+            return {2 ** bucket: {mode: round(s[mode][1], 3) for mode in (SERIAL, PARALLEL) if s[mode][0]}
+                    for bucket, s in sorted(self._stats.items())}
+
+    # ---------------- DISPATCH ----------------
+    @staticmethod
+    def _timed(func, X):
+        t0 = time.perf_counter()
+        result = func(X)
+        return result, (time.perf_counter() - t0) * 1000
+
+    def _run_parallel(self, members, X):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from threadpoolctl import ThreadpoolController
+
+                    self._controller = ThreadpoolController()
+                    self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="voc-ensemble")
+        with self._controller.limit(limits=self.inner_threads):
+            futures = {name: self._pool.submit(self._timed, func, X) for name, func in members.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def run(self, members, X, mode=None):
+        """
+        Call every member on X. `members` maps name -> callable(X).
+        Returns ({name: output}, {name: wall ms}) in the order of `members`.
+        """
+        if len(members) < 2:
+            mode = SERIAL
+        mode = mode or self.choose_mode(len(X))
+
+        t0 = time.perf_counter()
+        if mode == PARALLEL:
+            timed = self._run_parallel(members, X)
+        else:
+            timed = {name: self._timed(func, X) for name, func in members.items()}
+        self._record(len(X), mode, (time.perf_counter() - t0) * 1000)
+
+        return ({name: result for name, (result, _) in timed.items()},
+                {name: round(ms, 3) for name, (_, ms) in timed.items()})
+
+
+_executor_instance = None
+
+
+def get_ensemble_executor():
+    global _executor_instance
+
+    if _executor_instance is None:
+        _executor_instance = EnsembleExecutor()
+
+    return _executor_instance
@@ -0,0 +1,93 @@
+"""
+Session-scoped cache of per-chunk feature vectors.
+
+capture_mode computes every chunk's features once. Verification and the
+feedback buttons (reinforce / select actual person) then read the same
+vectors back from here instead of re-extracting them from raw samples.
+Entries are keyed by (session_id, chunk_idx) and evicted least-recently-used
+once the cache holds max_entries chunks.
+"""
+import itertools
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+FEATURE_CACHE_SIZE = int(os.environ.get("VOC_FEATURE_CACHE", "1024"))   # chunks
+
+
+class FeatureCache:
+
+    def __init__(self, max_entries=FEATURE_CACHE_SIZE):
+        self.max_entries = int(max_entries)
+        self._entries = OrderedDict()      # (session_id, chunk_idx) -> 1-D feature vector
+        self._names = {}                   # session_id -> feature names
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_session(self, names):
+        """Open a session whose chunks share the given feature names. Returns its id."""
+        session_id = next(self._ids)
+        with self._lock:
+            self._names[session_id] = list(names)
+        return session_id
+
+    def put(self, session_id, chunk_idx, vector):
+        key = (session_id, int(chunk_idx))
+        with self._lock:
+            self._entries[key] = np.asarray(vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                (old_session, _), _ = self._entries.popitem(last=False)
+                if not any(s == old_session for s, _ in self._entries):
+                    self._names.pop(old_session, None)
+
+    def put_matrix(self, session_id, matrix, start=0):
+        """Cache each row of a (chunks x features) matrix as chunk start, start+1, ..."""
+        for i, row in enumerate(np.asarray(matrix)):
+            self.put(session_id, start + i, row)
+
+    def get(self, session_id, chunk_idx):
+        key = (session_id, int(chunk_idx))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def get_matrix(self, session_id):
+        """
+        (matrix, names) of every cached chunk of a session in chunk order,
+        or None if the session is unknown or any of its chunks was evicted.
+        """
+        with self._lock:
+            names = self._names.get(session_id)
+            keys = sorted(k for k in self._entries if k[0] == session_id)
+            if names is None or not keys or [k[1] for k in keys] != list(range(len(keys))):
+                return None
+            for key in keys:
+                self._entries.move_to_end(key)
+            matrix = np.vstack([self._entries[k] for k in keys])
+        return np.ascontiguousarray(matrix), names
+
+    def drop_session(self, session_id):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == session_id]:
+                del self._entries[key]
+            self._names.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache_instance = None
+
+
+def get_feature_cache():
+    global _cache_instance
+
+    if _cache_instance is None:
+        _cache_instance = FeatureCache()
+
+    return _cache_instance
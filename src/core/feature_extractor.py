@@ -1,5 +1,16 @@
+import os
+
 import numpy as np
-from scipy.stats import skew, kurtosis
+
+# Per-sensor statistics, in feature-vector order
+FEATURE_STATS = ("min", "mean", "max", "std", "median", "iqr", "skew", "kurtosis", "cv", "energy")
+
+# Transition setting. The scipy-based extractor that produced the stored training features
+# reported cancellation noise for a constant non-zero channel (e.g. 50 x 3.3: skew -1.03,
+# kurtosis -2.09) instead of 0. Until the features table is recomputed and the models
+# retrained, reproduce those values so serve-time inputs match training. VOC_LEGACY_MOMENTS=0
+# reports 0 skew/kurtosis for (near-)constant channels.
+LEGACY_MOMENTS = os.environ.get("VOC_LEGACY_MOMENTS", "1") != "0"
 
 
 def safe_float(value):
@@ -12,6 +23,117 @@ def safe_float(value):
         return 0.0
 
 
+def feature_names(sensor_keys):
+    """Feature names in the column order of extract_features_batch()."""
+    return [f"{sensor}_{stat}" for sensor in sensor_keys for stat in FEATURE_STATS]
+
+
+def samples_to_array(voc_samples, sensor_keys=None):
+    """
+    Stack a list of ppm dicts into a (samples x sensors) float64 array.
+    Missing, None and non-finite readings become 0.0.
+    """
+    if sensor_keys is None:
+        sensor_keys = list(voc_samples[0].keys())
+    return np.array([[safe_float(sample.get(sensor, 0.0)) for sensor in sensor_keys]
+                     for sample in voc_samples], dtype=np.float64).reshape(len(voc_samples), len(sensor_keys))
+
+
+def stats_from_moments(n, min_v, max_v, mean_v, m2, m3, m4, q25, median_v, q75, energy_v, all_zero):
+    """
+    Turn per-sensor running moments into the ten FEATURE_STATS.
+
+    m2/m3/m4 are the central moments divided by n. Every argument after n is
+    an array over sensors (and optionally chunks); the result has a trailing
+    axis of len(FEATURE_STATS).
+    """
+    with np.errstate(all="ignore"):
+        std_v = np.sqrt(m2)
+        iqr_v = q75 - q25
+
+        # scipy.stats (1.16) returns NaN, i.e. 0 here, only below an eps-sized spread; the
+        # non-legacy cut-off is wide enough to also catch the cancellation noise of a constant channel
+        cutoff = np.finfo(np.float64).eps if LEGACY_MOMENTS else np.finfo(np.float64).resolution
+        flat = m2 <= (cutoff * mean_v) ** 2
+
+        # Bias-corrected skewness and excess kurtosis (scipy bias=False, fisher=True), in scipy's
+        # order of operations so the float64 values agree with it to within an ulp
+        if n >= 3:
+            skew_v = np.where(flat, 0.0, ((n - 1.0) * n) ** 0.5 / (n - 2.0) * m3 / m2 ** 1.5)
+        else:
+            skew_v = np.zeros_like(mean_v)
+        if n >= 4:
+            kurt_v = np.where(flat, 0.0,
+                              1.0 / (n - 2) / (n - 3) * ((n ** 2 - 1.0) * m4 / m2 ** 2.0 - 3 * (n - 1) ** 2.0)
+                              + 3.0 - 3.0)
+        else:
+            kurt_v = np.zeros_like(mean_v)
+
+        cv_v = np.where(mean_v != 0, std_v / mean_v, 0.0)
+
+    stats = np.stack([min_v, mean_v, max_v, std_v, median_v, iqr_v, skew_v, kurt_v, cv_v, energy_v], axis=-1)
+    stats[~np.isfinite(stats)] = 0.0
+
+    # A sensor that read all zeros gets all-zero features
+    stats[all_zero] = 0.0
+    return stats
+
+
+def _batch_stats(x):
+    """
+    All ten statistics for a (chunks x samples x sensors) float64 array.
+    Returns (chunks x sensors x 10) float64 in FEATURE_STATS order.
+    """
+    x = np.where(np.isfinite(x), x, 0.0)
+    # Each sensor's samples contiguous, so sums run in the same (pairwise) order as on a 1-D column
+    x = np.ascontiguousarray(np.swapaxes(x, 1, 2))
+
+    mean_v = x.mean(axis=-1)
+    d = x - mean_v[..., None]
+    d2 = d * d
+    q25, median_v, q75 = np.percentile(x, [25, 50, 75], axis=-1)
+
+    return stats_from_moments(
+        x.shape[-1], x.min(axis=-1), x.max(axis=-1), mean_v,
+        d2.mean(axis=-1), (d2 * d).mean(axis=-1), (d2 * d2).mean(axis=-1),
+        q25, median_v, q75, (x * x).sum(axis=-1), np.all(x == 0, axis=-1),
+    )
+
+
+def extract_features_batch(blocks):
+    """
+    Vectorized feature extraction.
+
+    `blocks` is a (samples x sensors) array, a (chunks x samples x sensors)
+    stack, or a sequence of (samples x sensors) arrays whose lengths may
+    differ. Returns a C-contiguous float32 matrix with one row per chunk and
+    sensors x FEATURE_STATS columns, laid out as feature_names(sensor_keys).
+    """
+    if isinstance(blocks, (list, tuple)):
+        arrays = [np.asarray(b, dtype=np.float64) for b in blocks]
+        if not arrays:
+            raise ValueError("no chunks to extract features from")
+        if any(len(a) == 0 for a in arrays):
+            raise ValueError("voc_samples list is empty")
+
+        # Chunks of equal length are computed together
+        out = np.empty((len(arrays), arrays[0].shape[1] * len(FEATURE_STATS)), dtype=np.float32)
+        lengths = np.array([len(a) for a in arrays])
+        for length in np.unique(lengths):
+            idx = np.flatnonzero(lengths == length)
+            out[idx] = extract_features_batch(np.stack([arrays[i] for i in idx]))
+        return out
+
+    x = np.asarray(blocks, dtype=np.float64)
+    if x.ndim == 2:
+        x = x[None]
+    if x.ndim != 3 or x.shape[1] == 0:
+        raise ValueError("expected a (samples x sensors) or (chunks x samples x sensors) array")
+
+    stats = _batch_stats(x)
+    return np.ascontiguousarray(stats.reshape(len(x), -1), dtype=np.float32)
+
+
 def extract_features(voc_samples):
     """
     Robust statistical feature extraction.
@@ -32,67 +154,27 @@ def extract_features(voc_samples):
     if not voc_samples:
         raise ValueError("voc_samples list is empty")
 
-    features = {}
-
     # Collect all sensor names from first sample
-    sensor_keys = voc_samples[0].keys()
+    sensor_keys = list(voc_samples[0].keys())
 
-    for sensor in sensor_keys:
+    stats = _batch_stats(samples_to_array(voc_samples, sensor_keys)[None])[0]
+    return dict(zip(feature_names(sensor_keys), stats.ravel().tolist()))
 
-        # Collect ALL values (including zero) for stability
-        values = [
-            safe_float(sample.get(sensor, 0.0))
-            for sample in voc_samples
-        ]
 
-        values_np = np.array(values, dtype=float)
+def extract_features_chunks(voc_samples, chunk_size):
+    """
+    Split ppm dicts into consecutive chunks of `chunk_size` and extract
+    every chunk in one batch. Returns (matrix, feature names).
+    """
+    if not voc_samples:
+        raise ValueError("voc_samples list is empty")
 
-        # If all values are zero, avoid division problems
-        if np.all(values_np == 0):
-            min_v = max_v = mean_v = std_v = median_v = 0.0
-            iqr_v = skew_v = kurt_v = cv_v = energy_v = 0.0
-        else:
-            min_v = safe_float(np.min(values_np))
-            max_v = safe_float(np.max(values_np))
-            mean_v = safe_float(np.mean(values_np))
-            std_v = safe_float(np.std(values_np))
-            median_v = safe_float(np.median(values_np))
-
-            # IQR
-            q75, q25 = np.percentile(values_np, [75, 25])
-            iqr_v = safe_float(q75 - q25)
-
-            # Skew
-            if len(values_np) >= 3:
-                skew_v = safe_float(skew(values_np, bias=False))
-            else:
-                skew_v = 0.0
-
-            # Kurtosis
-            if len(values_np) >= 4:
-                kurt_v = safe_float(kurtosis(values_np, fisher=True, bias=False))
-            else:
-                kurt_v = 0.0
-
-            # Coefficient of Variation
-            if mean_v != 0:
-                cv_v = safe_float(std_v / mean_v)
-            else:
-                cv_v = 0.0
-
-            # Energy
-            energy_v = safe_float(np.sum(values_np ** 2))
-
-        # Store features
-        features[f"{sensor}_min"] = min_v
-        features[f"{sensor}_mean"] = mean_v
-        features[f"{sensor}_max"] = max_v
-        features[f"{sensor}_std"] = std_v
-        features[f"{sensor}_median"] = median_v
-        features[f"{sensor}_iqr"] = iqr_v
-        features[f"{sensor}_skew"] = skew_v
-        features[f"{sensor}_kurtosis"] = kurt_v
-        features[f"{sensor}_cv"] = cv_v
-        features[f"{sensor}_energy"] = energy_v
-
-    return features
+    sensor_keys = list(voc_samples[0].keys())
+    x = samples_to_array(voc_samples, sensor_keys)
+    chunks = [x[i:i + chunk_size] for i in range(0, len(x), chunk_size)]
+    return extract_features_batch(chunks), feature_names(sensor_keys)
+
+
+def feature_dicts(matrix, names):
+    """Dict form of each row of a feature matrix."""
+    return [dict(zip(names, row)) for row in np.asarray(matrix, dtype=np.float64).tolist()]
@@ -0,0 +1,381 @@
+"""
+Process-wide registry for the verification model bundle.
+
+The bundle (five classifiers, ANN scaler, label encoder, feature order,
+embedding projection, with compiled NumPy or ONNX members standing in for
+the pickled classifiers when exported) is loaded once and then served
+from memory.
+
+training/train_all.py writes its artifacts one after another over several
+minutes. Before the first one it replaces bundle_manifest.json with an
+in-progress marker (training id, pid, host); after the last one it writes
+the complete manifest: every file of the run with its size and SHA-256.
+The registry only reloads when that manifest changes, loads only the
+files it lists (a leftover export from an older run is ignored) and
+checks their hashes before swapping the new bundle in with one
+assignment. While a run is in progress, or when the files do not match,
+the background reload keeps the current bundle and retries later.
+
+On first use there is no bundle to keep, so reload() waits (with backoff,
+for at most VOC_MODEL_LOAD_TIMEOUT s) only while the training process is
+still alive. A run that crashed or was interrupted, or files that do not
+match a complete manifest, fall back straight away to loading the
+artifacts as found, unverified, as model directories from before
+manifests are loaded; the next complete manifest replaces that bundle.
+"""
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import joblib
+
+from core.embedding import EMBEDDING_FILE, load_embedding_model
+from core.ensemble_executor import get_ensemble_executor, pin_member_jobs
+from core.numpy_runtime import LABELS_FILE, NUMPY_FILES, ORDER_FILE, load_metadata, load_numpy_members
+from core.onnx_runtime import ONNX_FILES, load_onnx_members
+from utils.timing import span
+
+SENSOR_MODE = int(os.environ.get("VOC_SENSOR_MODE", "6"))
+MODELS_DIR = Path(__file__).parent.parent.parent / "models" / f"{SENSOR_MODE}_sensors"
+CHECK_INTERVAL = float(os.environ.get("VOC_MODEL_CHECK_INTERVAL", "2.0"))
+LOAD_TIMEOUT = float(os.environ.get("VOC_MODEL_LOAD_TIMEOUT", "60"))     # seconds reload() keeps retrying
+RETRY_DELAY = 0.5           # first backoff while artifacts do not match their manifest
+MAX_RETRY_DELAY = 10.0
+MANIFEST_FILE = "bundle_manifest.json"
+# Engines tried per member, in order; a member with no exported artifact for any of them runs from
+# its pickle. "sklearn" alone forces the pickles.
+INFERENCE_ENGINES = [e.strip() for e in os.environ.get("VOC_INFERENCE_ENGINE", "numpy,onnx").lower().split(",")
+                     if e.strip()]
+
+ENGINE_LOADERS = {
+    "numpy": load_numpy_members,
+    "onnx": load_onnx_members,
+}
+ENGINE_FILES = {
+    "numpy": NUMPY_FILES,
+    "onnx": ONNX_FILES,
+}
+
+MODEL_FILES = {
+    "rf": "rf_model.pkl",
+    "et": "et_model.pkl",
+    "dt": "dt_model.pkl",
+    "xgb": "xgb_model.pkl",
+    "ann": "ann_model.pkl",
+    "scaler": "ann_scaler.pkl",
+    "le": "label_encoder.pkl",
+    "order": "feature_order.pkl",
+}
+
+
+def artifact_files():
+    """Every file a bundle can consist of."""
+    return (list(MODEL_FILES.values()) + list(NUMPY_FILES.values()) + list(ONNX_FILES.values())
+            + [LABELS_FILE, ORDER_FILE, EMBEDDING_FILE])
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _new_training_id():
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def _write_manifest(models_dir, manifest):
+    os.makedirs(models_dir, exist_ok=True)
+    path = os.path.join(models_dir, MANIFEST_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+    return manifest
+
+
+def begin_bundle(models_dir=MODELS_DIR, training_id=None):
+    """
+    Mark the bundle in `models_dir` as being rewritten. Training calls this
+    before its first artifact, so the registry never verifies a half-written
+    bundle against the previous run's manifest. Returns the training id.
+    """
+    training_id = training_id or _new_training_id()
+    _write_manifest(models_dir, {
+        "training_id": training_id,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "complete": False,
+        "pid": os.getpid(),
+        "host": socket.gethostname(),
+        "files": {},
+    })
+    return training_id
+
+
+def training_running(manifest):
+    """True if `manifest` marks a run in progress whose process is still alive on this host."""
+    if manifest is None or manifest.get("complete", True):
+        return False
+    if manifest.get("host") != socket.gethostname():
+        return True     # cannot tell; assume the run is alive
+    try:
+        os.kill(manifest["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_bundle_manifest(models_dir=MODELS_DIR, training_id=None):
+    """
+    Record the artifacts now in `models_dir` as one bundle. Training calls
+    this after its last artifact is written; the registry picks the bundle
+    up only then.
+    """
+    files = {}
+    for filename in artifact_files():
+        path = os.path.join(models_dir, filename)
+        if os.path.exists(path):
+            files[filename] = {"size": os.path.getsize(path), "sha256": file_sha256(path)}
+    return _write_manifest(models_dir, {
+        "training_id": training_id or _new_training_id(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "complete": True,
+        "files": files,
+    })
+
+
+def read_bundle_manifest(models_dir=MODELS_DIR):
+    """The bundle manifest, or None for a model directory written before manifests."""
+    try:
+        with open(os.path.join(models_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def manifest_state(models_dir=MODELS_DIR):
+    """Cheap change marker for the manifest: (mtime_ns, size), or None when there is none."""
+    try:
+        st = os.stat(os.path.join(models_dir, MANIFEST_FILE))
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_bundle(models_dir=MODELS_DIR, engines=INFERENCE_ENGINES, files=None):
+    """
+    Load every artifact. Each ensemble member is served by the first engine
+    in `engines` that has an export for it; its pickle is then not unpickled
+    at all. bundle["engines"] records which engine each member runs on.
+    The label classes and feature order come from their JSON exports when
+    present, so a fully exported bundle unpickles nothing.
+
+    With `files` (the filenames of a manifest) only those are used; files
+    outside it are treated as absent. bundle["files"] lists what was read.
+    """
+    def listed(filename):
+        return files is None or filename in files
+
+    bundle, served_by, loaded, pickled = {}, {}, [], {}
+    for engine in engines:
+        loader = ENGINE_LOADERS.get(engine)
+        if loader is None:
+            continue
+        exports = ENGINE_FILES[engine]
+        remaining = [key for key in ONNX_FILES if key not in bundle and listed(exports.get(key))]
+        for key, member in loader(models_dir, remaining).items():
+            bundle[key] = member
+            served_by[key] = engine
+            loaded.append(exports[key])
+    for key, value in load_metadata(models_dir).items():
+        filename = LABELS_FILE if key == "le" else ORDER_FILE
+        if listed(filename):
+            bundle[key] = value
+            loaded.append(filename)
+
+    for key, filename in MODEL_FILES.items():
+        if key in bundle:
+            continue
+        if key == "scaler" and getattr(bundle.get("ann"), "includes_scaler", False):
+            bundle[key] = None      # folded into the exported ANN
+            continue
+        if not listed(filename):
+            raise FileNotFoundError(f"{filename} is not part of the bundle in {models_dir}")
+        bundle[key] = pickled[key] = joblib.load(os.path.join(models_dir, filename))
+        loaded.append(filename)
+    if get_ensemble_executor().threads > 1:
+        # Members run side by side; their own joblib pools would oversubscribe the cores
+        pin_member_jobs(pickled)
+    bundle["engines"] = {key: served_by.get(key, "sklearn") for key in ONNX_FILES}
+    # None until a projection is trained
+    bundle["embedding"] = load_embedding_model(models_dir) if listed(EMBEDDING_FILE) else None
+    if bundle["embedding"] is not None:
+        loaded.append(EMBEDDING_FILE)
+        if bundle["embedding"].feature_order is None:
+            # Exported before the projection stored its order; it was trained with the members
+            bundle["embedding"].feature_order = list(bundle["order"])
+    bundle["files"] = loaded
+    return bundle
+
+
+class ModelRegistry:
+
+    def __init__(self, models_dir=MODELS_DIR, check_interval=CHECK_INTERVAL, load_timeout=LOAD_TIMEOUT):
+        self.models_dir = models_dir
+        self.check_interval = check_interval
+        self.load_timeout = load_timeout
+
+        self._bundle = None
+        self._state = None
+        self.version = 0
+        self.training_id = None
+        self.loaded_at = None
+
+        self._last_check = 0.0
+        self._retry_delay = 0.0     # background backoff after a failed reload
+        self._retry_after = 0.0
+        self._lock = threading.Lock()
+        self._first_load = threading.Lock()
+        self._reloader = None
+
+    # ---------------- LOADING ----------------
+    def _load_as_found(self, state):
+        """Load whatever artifacts are in the directory, without a manifest to check them against."""
+        missing = [f for f in MODEL_FILES.values() if not os.path.exists(os.path.join(self.models_dir, f))]
+        if missing:
+            raise FileNotFoundError(f"Missing model artifacts in {self.models_dir}: {missing}")
+        with span("models.load"):
+            return load_bundle(self.models_dir), state, None
+
+    def _load(self):
+        """
+        Load the bundle the manifest describes. Returns (bundle, state, manifest), or None
+        while training is rewriting the bundle or if the files on disk do not match the manifest.
+        """
+        state = manifest_state(self.models_dir)
+        manifest = read_bundle_manifest(self.models_dir)
+        if manifest is None:
+            return self._load_as_found(state)
+        if not manifest.get("complete", True):
+            return None
+
+        files = manifest["files"]
+        for filename, meta in files.items():
+            try:
+                if os.path.getsize(os.path.join(self.models_dir, filename)) != meta["size"]:
+                    return None
+            except FileNotFoundError:
+                return None
+        with span("models.load"):
+            bundle = load_bundle(self.models_dir, files=set(files))
+        # Anything read must be the file the manifest describes, not a rewrite in progress
+        for filename in bundle["files"]:
+            if file_sha256(os.path.join(self.models_dir, filename)) != files[filename]["sha256"]:
+                return None
+        if manifest_state(self.models_dir) != state:
+            return None
+        return bundle, state, manifest
+
+    def _swap(self, bundle, state, manifest):
+        with self._lock:
+            self._bundle = bundle
+            self._state = state
+            self.version += 1
+            self.training_id = manifest["training_id"] if manifest else None
+            self.loaded_at = time.time()
+        engines = ", ".join(f"{k}={v}" for k, v in bundle["engines"].items())
+        source = f"training {self.training_id}" if self.training_id else "unverified"
+        print(f"[MODELS] Loaded bundle v{self.version} ({source}) from {self.models_dir} ({engines})")
+
+    def _reload_in_background(self):
+        loaded = None
+        try:
+            loaded = self._load()
+            if loaded is not None:
+                self._swap(*loaded)
+                self._retry_delay = 0.0
+            else:
+                print(f"[MODELS] Artifacts do not match a complete manifest yet, keeping v{self.version}")
+        except Exception as e:
+            print(f"[MODELS] Reload failed, keeping v{self.version}: {e}")
+        if loaded is None:
+            # Back off instead of re-hashing on every check; set before _reloader is cleared,
+            # so check() cannot start another reload ahead of it
+            self._retry_delay = min(max(self._retry_delay * 2, RETRY_DELAY), MAX_RETRY_DELAY)
+            self._retry_after = time.monotonic() + self._retry_delay
+        self._reloader = None
+
+    def reload(self):
+        """
+        Load the current artifacts synchronously (first use, or after an explicit retrain).
+        Waits with backoff, for at most load_timeout s, only while a live training run is
+        rewriting them; otherwise a bundle that does not match its manifest is loaded as found.
+        """
+        deadline = time.monotonic() + self.load_timeout
+        delay = RETRY_DELAY
+        while True:
+            loaded = self._load()
+            if loaded is not None:
+                self._swap(*loaded)
+                return self._bundle
+            manifest = read_bundle_manifest(self.models_dir)
+            if not training_running(manifest):
+                reason = ("training run did not finish" if manifest and not manifest.get("complete", True)
+                          else f"artifacts do not match {MANIFEST_FILE}")
+                break
+            if time.monotonic() + delay > deadline:
+                reason = f"training still running after {self.load_timeout:.0f}s"
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+        print(f"[MODELS] WARNING: {reason} in {self.models_dir}; loading the artifacts as found, unverified")
+        self._swap(*self._load_as_found(manifest_state(self.models_dir)))
+        return self._bundle
+
+    # ---------------- ACCESS ----------------
+    def is_stale(self):
+        return self._bundle is not None and manifest_state(self.models_dir) != self._state
+
+    def check(self):
+        """Start a background reload if training published a new manifest since the served bundle was loaded."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval or now < self._retry_after:
+            return
+        self._last_check = now
+
+        if self._reloader is None and self.is_stale():
+            self._reloader = threading.Thread(target=self._reload_in_background, name="voc-model-reload",
+                                              daemon=True)
+            self._reloader.start()
+
+    def get(self):
+        """The current model bundle. Loads synchronously only the very first time."""
+        with span("models.get"):
+            if self._bundle is None:
+                with self._first_load:
+                    if self._bundle is None:
+                        return self.reload()
+            self.check()
+            return self._bundle
+
+
+_registry_instance = None
+
+
+def get_registry():
+    global _registry_instance
+
+    if _registry_instance is None:
+        _registry_instance = ModelRegistry()
+
+    return _registry_instance
@@ -0,0 +1,429 @@
+"""
+Pure-NumPy inference for the verification ensemble.
+
+training/train_all.py compiles the tree members (RF, ET, DT) into
+<member>_model.npz: every tree of the ensemble packed into flat node
+arrays (feature, threshold, left, right, leaf value). CompiledTrees walks
+all trees for a batch of rows together, one tree level per NumPy step, and
+reproduces sklearn's predict_proba bit for bit. XGBoost's boosted trees
+use the same node layout (CompiledBoostedTrees); being many and shallow,
+they are walked from a table of every split evaluated once per row, and
+their leaf margins are summed per class before the softmax. The ANN is exported as ann_model.npz:
+float32 weights with the StandardScaler folded into the first layer,
+evaluated by NumpyMLP as matmul -> relu -> ... -> softmax. The label
+classes and feature order are plain JSON. The archives are memory-mapped
+(core.array_store), so loading the bundle neither unpickles anything nor
+imports sklearn or xgboost.
+"""
+import json
+import os
+
+import numpy as np
+
+from core.array_store import load_arrays, save_arrays
+
+NUMPY_FILES = {
+    "rf": "rf_model.npz",
+    "et": "et_model.npz",
+    "dt": "dt_model.npz",
+    "xgb": "xgb_model.npz",
+    "ann": "ann_model.npz",
+}
+LABELS_FILE = "label_classes.json"
+ORDER_FILE = "feature_order.json"
+
+
+# ---------------- TREE ENSEMBLES ----------------
+def compile_trees(model):
+    """
+    Flatten a fitted DecisionTree / RandomForest / ExtraTrees classifier into
+    packed arrays. Node indices are global across trees; a leaf points to
+    itself on both sides so the walk can stop there. Leaf values are stored
+    already normalized, exactly as each tree's predict_proba computes them.
+    """
+    estimators = getattr(model, "estimators_", None)
+    trees = [est.tree_ for est in estimators] if estimators is not None else [model.tree_]
+    n_classes = int(model.n_classes_)
+
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        n = tree.node_count
+        ids = np.arange(offset, offset + n, dtype=np.int32)
+        leaf = tree.children_left == -1
+        feature.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+        threshold.append(tree.threshold.astype(np.float64))
+        left.append(np.where(leaf, ids, tree.children_left + offset).astype(np.int32))
+        right.append(np.where(leaf, ids, tree.children_right + offset).astype(np.int32))
+
+        proba = tree.value[:, 0, :n_classes]
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value.append(proba / normalizer)
+
+        roots.append(offset)
+        offset += n
+
+    return {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "value": np.ascontiguousarray(np.concatenate(value)),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "classes": np.asarray(model.classes_),
+        "average": np.asarray(estimators is not None),
+        "n_features": np.asarray(int(model.n_features_in_)),
+    }
+
+
+class CompiledTrees:
+    """predict_proba over a compiled tree ensemble."""
+
+    def __init__(self, arrays, path=None):
+        self.path = path
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = np.asarray(arrays["roots"])
+        self.classes_ = np.asarray(arrays["classes"])
+        self.average = bool(arrays["average"])
+        self.n_features = int(arrays["n_features"])
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(compile_trees(model))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(load_arrays(path, mmap=mmap), path=str(path))
+
+    def save(self, path):
+        save_arrays(path, feature=self.feature, threshold=self.threshold, left=self.left,
+                    right=self.right, value=self.value, roots=self.roots, classes=self.classes_,
+                    average=np.asarray(self.average), n_features=np.asarray(self.n_features))
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """Leaf node (global index) reached by every row in every tree, shape (trees, rows)."""
+        # sklearn evaluates trees on float32 input against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None]
+        n_rows = X.shape[0]
+
+        node = np.repeat(self.roots, n_rows)                 # tree-major: (tree, row) -> t * rows + r
+        row = np.tile(np.arange(n_rows), self.n_trees)
+        active = np.flatnonzero(self.left[node] != node)
+
+        # One tree level per step for every (tree, row) pair still at an internal node
+        while active.size:
+            at = node[active]
+            go_left = X[row[active], self.feature[at]] <= self.threshold[at]
+            at = np.where(go_left, self.left[at], self.right[at])
+            node[active] = at
+            active = active[self.left[at] != at]
+
+        return node.reshape(self.n_trees, n_rows)
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        if not self.average:
+            return self.value[leaves[0]]
+        # Summing over the leading (tree) axis adds tree after tree, the same order in which the
+        # forest's predict_proba accumulates, so the result matches it bit for bit
+        proba = self.value[leaves].sum(axis=0)
+        proba /= self.n_trees
+        return proba
+
+
+def compile_boosted_trees(model):
+    """
+    Flatten a fitted XGBClassifier (gbtree booster) into CompiledTrees
+    arrays. XGBoost sends a row left when x < split (in float32); that is
+    stored as x <= the next float32 below the split. A leaf's value row
+    holds its margin in the column of the class its tree belongs to. The
+    constant base margin is measured from the booster rather than derived
+    from base_score, whose encoding differs between XGBoost versions.
+    """
+    booster = model.get_booster()
+    gbtree = json.loads(booster.save_raw(raw_format="json"))["learner"]["gradient_booster"]
+    if gbtree["name"] != "gbtree":
+        raise ValueError(f"unsupported booster {gbtree['name']}")
+    trees, tree_class = gbtree["model"]["trees"], gbtree["model"]["tree_info"]
+    n_classes = int(model.n_classes_)
+    n_outputs = n_classes if n_classes > 2 else 1
+
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree, cls in zip(trees, tree_class):
+        children_left = np.asarray(tree["left_children"], dtype=np.int64)
+        children_right = np.asarray(tree["right_children"], dtype=np.int64)
+        split = np.asarray(tree["split_conditions"], dtype=np.float32)
+        n = len(children_left)
+        ids = np.arange(offset, offset + n, dtype=np.int32)
+        leaf = children_left == -1
+        feature.append(np.where(leaf, 0, tree["split_indices"]).astype(np.int32))
+        threshold.append(np.nextafter(split, np.float32(-np.inf)).astype(np.float64))
+        left.append(np.where(leaf, ids, children_left + offset).astype(np.int32))
+        right.append(np.where(leaf, ids, children_right + offset).astype(np.int32))
+
+        margins = np.zeros((n, n_outputs))
+        margins[:, int(cls)] = np.where(leaf, split, 0.0)   # a leaf's split_condition is its value
+        value.append(margins)
+
+        roots.append(offset)
+        offset += n
+
+    arrays = {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "value": np.ascontiguousarray(np.concatenate(value)),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "classes": np.asarray(model.classes_),
+        "average": np.asarray(False),
+        "n_features": np.asarray(int(model.n_features_in_)),
+        "base_margin": np.zeros(n_outputs),
+        "tree_class": np.asarray(tree_class[:len(trees)], dtype=np.int32),
+    }
+    probe = np.zeros((1, arrays["n_features"]), dtype=np.float32)
+    leaf_sum = CompiledBoostedTrees(arrays).margins(probe)
+    booster_margin = np.asarray(model.predict(probe, output_margin=True), dtype=np.float64).reshape(1, -1)
+    arrays["base_margin"] = (booster_margin - leaf_sum)[0]
+    return arrays
+
+
+class CompiledBoostedTrees(CompiledTrees):
+    """predict_proba over compiled XGBoost trees: summed leaf margins -> softmax (or logistic)."""
+
+    def __init__(self, arrays, path=None):
+        super().__init__(arrays, path)
+        self.base_margin = np.asarray(arrays["base_margin"], dtype=np.float64)
+        self.tree_class = np.asarray(arrays["tree_class"])
+        # Every leaf feeds one class: keep its margin as a scalar and map trees to classes one-hot
+        self.leaf_margin = np.ascontiguousarray(self.value.sum(axis=1))
+        self.tree_onehot = np.zeros((self.n_trees, len(self.base_margin)))
+        self.tree_onehot[np.arange(self.n_trees), self.tree_class] = 1.0
+        self.max_depth = self._max_depth()
+        # Split nodes, and the child table indexed [went left, node]
+        self.splits = np.flatnonzero(self.left != np.arange(len(self.left)))
+        self.split_feature = np.asarray(self.feature[self.splits])
+        self.split_threshold = np.asarray(self.threshold[self.splits])[:, None]
+        self.children = np.stack([self.right, self.left])
+
+    def _max_depth(self):
+        depth, frontier = 0, self.roots
+        while True:
+            frontier = frontier[self.left[frontier] != frontier]
+            if not frontier.size:
+                return depth
+            frontier = np.concatenate([self.left[frontier], self.right[frontier]])
+            depth += 1
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(compile_boosted_trees(model))
+
+    def save(self, path):
+        save_arrays(path, feature=self.feature, threshold=self.threshold, left=self.left,
+                    right=self.right, value=self.value, roots=self.roots, classes=self.classes_,
+                    average=np.asarray(False), n_features=np.asarray(self.n_features),
+                    base_margin=self.base_margin, tree_class=self.tree_class)
+
+    def apply(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None]
+        n_rows = X.shape[0]
+
+        # Boosted trees are shallow and many: evaluate every split for every row at once, then
+        # step all (tree, row) pairs max_depth times; leaves point to themselves, so pairs that
+        # reached one stay put
+        go_left = np.zeros((len(self.left), n_rows), dtype=np.int8)
+        go_left[self.splits] = X[:, self.split_feature].T <= self.split_threshold
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        rows = np.arange(n_rows)
+        for _ in range(self.max_depth):
+            node = self.children[go_left[node, rows], node]
+
+        return node
+
+    def margins(self, X):
+        return self.leaf_margin[self.apply(X)].T @ self.tree_onehot + self.base_margin
+
+    def predict_proba(self, X):
+        z = self.margins(X)
+        if z.shape[1] == 1:
+            # Binary objectives have a single logistic margin for the positive class
+            p = _logistic(z)
+            return np.hstack([1 - p, p])
+        return _softmax(z)
+
+
+# ---------------- MLP ----------------
+def _relu(z):
+    return np.maximum(z, 0, out=z)
+
+
+def _logistic(z):
+    np.negative(z, out=z)
+    np.exp(z, out=z)
+    z += 1
+    return np.reciprocal(z, out=z)
+
+
+def _softmax(z):
+    z -= z.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    z /= z.sum(axis=1, keepdims=True)
+    return z
+
+
+ACTIVATIONS = {
+    "identity": lambda z: z,
+    "relu": _relu,
+    "tanh": lambda z: np.tanh(z, out=z),
+    "logistic": _logistic,
+    "softmax": _softmax,
+}
+
+
+def compile_mlp(model, scaler=None):
+    """
+    float32 layer weights of a fitted MLPClassifier. With a StandardScaler the
+    standardization is folded into the first layer:
+    ((x - mean) / scale) @ W + b  ==  x @ (W / scale) + (b - (mean / scale) @ W).
+    """
+    coefs = [np.asarray(w, dtype=np.float64) for w in model.coefs_]
+    intercepts = [np.asarray(b, dtype=np.float64) for b in model.intercepts_]
+    if scaler is not None:
+        mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(coefs[0].shape[0])
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(coefs[0].shape[0])
+        intercepts[0] = intercepts[0] - (mean / scale) @ coefs[0]
+        coefs[0] = coefs[0] / scale[:, np.newaxis]
+
+    arrays = {
+        "n_layers": np.asarray(len(coefs)),
+        "activation": np.asarray(model.activation),
+        "out_activation": np.asarray(model.out_activation_),
+        "classes": np.asarray(model.classes_),
+        "includes_scaler": np.asarray(scaler is not None),
+    }
+    for i, (w, b) in enumerate(zip(coefs, intercepts)):
+        arrays[f"coef_{i}"] = np.ascontiguousarray(w, dtype=np.float32)
+        arrays[f"intercept_{i}"] = np.ascontiguousarray(b, dtype=np.float32)
+    return arrays
+
+
+class NumpyMLP:
+    """predict_proba of an exported MLP, batched over rows, in float32."""
+
+    def __init__(self, arrays, path=None):
+        self.arrays = arrays
+        self.path = path
+        n_layers = int(arrays["n_layers"])
+        self.coefs = [arrays[f"coef_{i}"] for i in range(n_layers)]
+        self.intercepts = [arrays[f"intercept_{i}"] for i in range(n_layers)]
+        self.activation = str(arrays["activation"])
+        self.out_activation = str(arrays["out_activation"])
+        self.classes_ = np.asarray(arrays["classes"])
+        # With the scaler folded in, the model takes raw features like the tree members
+        self.includes_scaler = bool(arrays["includes_scaler"])
+        self.n_features = self.coefs[0].shape[0]
+
+    @classmethod
+    def from_model(cls, model, scaler=None):
+        return cls(compile_mlp(model, scaler))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(load_arrays(path, mmap=mmap), path=str(path))
+
+    def save(self, path):
+        save_arrays(path, **self.arrays)
+
+    def predict_proba(self, X):
+        a = np.asarray(X, dtype=np.float32)
+        if a.ndim == 1:
+            a = a[None]
+        hidden = ACTIVATIONS[self.activation]
+        last = len(self.coefs) - 1
+        for i, (w, b) in enumerate(zip(self.coefs, self.intercepts)):
+            a = a @ w
+            a += b
+            a = ACTIVATIONS[self.out_activation](a) if i == last else hidden(a)
+        if a.shape[1] == 1:
+            # Binary MLPs have a single logistic output for the positive class
+            a = np.hstack([1 - a, a])
+        return a
+
+
+MEMBER_TYPES = {
+    "rf": CompiledTrees,
+    "et": CompiledTrees,
+    "dt": CompiledTrees,
+    "xgb": CompiledBoostedTrees,
+    "ann": NumpyMLP,
+}
+
+
+# ---------------- LABELS / FEATURE ORDER ----------------
+class LabelClasses:
+    """The parts of a fitted LabelEncoder verification uses, without sklearn."""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def inverse_transform(self, y):
+        return self.classes_[np.asarray(y, dtype=np.intp)]
+
+
+def save_metadata(output_dir, classes, feature_order):
+    """Write the label classes and feature order as JSON next to the model exports."""
+    for filename, data in ((LABELS_FILE, [c.item() if hasattr(c, "item") else c for c in classes]),
+                           (ORDER_FILE, list(feature_order))):
+        path = os.path.join(output_dir, filename)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+
+
+def load_metadata(models_dir):
+    """{"le": LabelClasses, "order": [...]} from the JSON exports; keys whose file is missing are left out."""
+    metadata = {}
+    for key, filename in (("le", LABELS_FILE), ("order", ORDER_FILE)):
+        path = os.path.join(models_dir, filename)
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[NUMPY] Could not load {filename}: {e}")
+            continue
+        metadata[key] = LabelClasses(data) if key == "le" else data
+    return metadata
+
+
+def load_numpy_members(models_dir, keys=None, mmap=True):
+    """Compiled member for every exported .npz; members without one are left to the other engines."""
+    members = {}
+    for key, filename in NUMPY_FILES.items():
+        if keys is not None and key not in keys:
+            continue
+        path = os.path.join(models_dir, filename)
+        if not os.path.exists(path):
+            continue
+        try:
+            members[key] = MEMBER_TYPES[key].load(path, mmap=mmap)
+        except Exception as e:
+            print(f"[NUMPY] Could not load {filename}: {e}")
+    return members
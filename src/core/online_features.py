@@ -0,0 +1,106 @@
+"""
+Incremental feature extraction for live sessions.
+
+OnlineFeatureAccumulator takes one sample at a time and can produce the
+full feature vector (same statistics and order as extract_features_batch)
+at any moment, so a round never has to be buffered as a list of dicts
+before its features exist.
+
+Per channel it keeps min/max/energy, the running mean and the second to
+fourth central moments (Welford/Pebay one-pass updates), plus a bounded
+reservoir for median and IQR. Memory does not grow with the number of
+samples; median and IQR are exact while the sample count stays within the
+reservoir size and a uniform-sample estimate beyond it. While the reservoir
+still holds every sample (a normal round), snapshots are computed from it
+with the batch extractor, so they equal extract_features() including its
+legacy skew/kurtosis of constant channels.
+"""
+import numpy as np
+
+from core.feature_extractor import _batch_stats, feature_names, safe_float, stats_from_moments
+
+RESERVOIR_SIZE = 64     # >= SAMPLE_COUNT, so a full round's median/IQR are exact
+
+
+class OnlineFeatureAccumulator:
+
+    def __init__(self, sensor_keys, reservoir_size=RESERVOIR_SIZE, seed=0):
+        self.sensor_keys = list(sensor_keys)
+        self.names = feature_names(self.sensor_keys)
+        self.reservoir_size = int(reservoir_size)
+        self._rng = np.random.default_rng(seed)
+
+        k = len(self.sensor_keys)
+        self.n = 0
+        self._min = np.full(k, np.inf)
+        self._max = np.full(k, -np.inf)
+        self._mean = np.zeros(k)
+        self._m2 = np.zeros(k)
+        self._m3 = np.zeros(k)
+        self._m4 = np.zeros(k)
+        self._energy = np.zeros(k)
+        self._nonzero = np.zeros(k, dtype=bool)
+        self._reservoir = np.empty((self.reservoir_size, k))
+
+    def __len__(self):
+        return self.n
+
+    # ---------------- UPDATES ----------------
+    def add(self, voc):
+        """Add one ppm dict (missing, None and non-finite readings count as 0.0)."""
+        self.add_array([safe_float(voc.get(sensor, 0.0)) for sensor in self.sensor_keys])
+
+    def add_array(self, row):
+        """Add one sample given as values in sensor_keys order."""
+        x = np.asarray(row, dtype=np.float64)
+        x = np.where(np.isfinite(x), x, 0.0)
+
+        n1 = self.n
+        n = n1 + 1
+        delta = x - self._mean
+        delta_n = delta / n
+        delta_n2 = delta_n * delta_n
+        term1 = delta * delta_n * n1
+
+        self._mean += delta_n
+        self._m4 += term1 * delta_n2 * (n * n - 3 * n + 3) + 6 * delta_n2 * self._m2 - 4 * delta_n * self._m3
+        self._m3 += term1 * delta_n * (n - 2) - 3 * delta_n * self._m2
+        self._m2 += term1
+        self.n = n
+
+        np.minimum(self._min, x, out=self._min)
+        np.maximum(self._max, x, out=self._max)
+        self._energy += x * x
+        self._nonzero |= x != 0
+
+        # Reservoir sampling (Algorithm R): every sample so far is kept with equal probability
+        if n1 < self.reservoir_size:
+            self._reservoir[n1] = x
+        else:
+            j = self._rng.integers(n)
+            if j < self.reservoir_size:
+                self._reservoir[j] = x
+
+    # ---------------- SNAPSHOTS ----------------
+    def _stats(self):
+        if self.n == 0:
+            raise ValueError("no samples accumulated")
+        n = self.n
+        held = self._reservoir[:min(n, self.reservoir_size)]
+        if n <= self.reservoir_size:
+            return _batch_stats(held[None])[0]
+        q25, median_v, q75 = np.percentile(held, [25, 50, 75], axis=0)
+        return stats_from_moments(
+            n, self._min, self._max, self._mean,
+            self._m2 / n, self._m3 / n, self._m4 / n,
+            q25, median_v, q75, self._energy, ~self._nonzero,
+        )
+
+    def snapshot(self):
+        """Current feature vector as float32, laid out as self.names."""
+        return np.ascontiguousarray(self._stats().reshape(-1), dtype=np.float32)
+
+    def snapshot_dict(self):
+        """Current features in extract_features() dict form."""
+        return dict(zip(self.names, self._stats().reshape(-1).tolist()))
+
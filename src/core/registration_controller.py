@@ -1,49 +1,56 @@
 import time
 import uuid
 import numpy as np
-import sqlite3
 
-from sensors.sensor_reader import VOCSensor
-from features.feature_extractor import extract_features
+from sensors.acquisition import get_acquisition
+from core.feature_extractor import extract_features
 
 from database.user_dao import insert_user
-from database.feature_dao import insert_features
-from database.model_dao import insert_kmeans_model
+from database.feature_dao import store_features
 
 from utils.secure_voc_logger import log_user_data
-from core.verification_controller import generate_embedding
+from core.verification_controller import enroll_embeddings
+from core.template_matcher import enroll_templates
 
-from sensors.Fan_controller import FanController
+from sensors.flush_controller import get_flush_controller
+from sensors.fan_scheduler import get_fan_scheduler
 
 
 import os
 
 SENSOR_MODE = int(os.environ.get("VOC_SENSOR_MODE", "6"))
 NUM_ROUNDS = 6 if SENSOR_MODE == 12 else 10
+SAMPLES_PER_ROUND = 30      # one feature vector per round, over as many samples as a GUI round
+ROUND_TIMEOUT = 30          # seconds to wait for a round's samples
 ROUND_DELAY = 20
 RETRY_DELAY = 5
-FLUSH_DURATION = 30
+FLUSH_DURATION = 30   # upper bound; the flush ends earlier once sensors are back at baseline
 
 
 # ---------------- FAN FLUSH ----------------
 def flush_chamber():
-    print("\n[INFO] Waiting for hand removal before flushing...")
+    """Queue a chamber flush and return its handle; the fan scheduler runs it in the background."""
+    return get_fan_scheduler().request_flush(FLUSH_DURATION, reason="registration")   # SAME LOGIC AS VERIFICATION
 
-    fan = FanController()   # SAME LOGIC AS VERIFICATION
 
-    fan.flush(FLUSH_DURATION)
-
-    print("[INFO] Flushing completed\n")
-
-
-def safe_sensor_read(sensor):
+def safe_round_read(engine):
+    """The valid samples of one round (SAMPLES_PER_ROUND readings), or None if none came in."""
     try:
-        status, voc, _ = sensor.read_sensors()
-
-        if status != "OK":
+        block = next(engine.iter_blocks(SAMPLES_PER_ROUND, timeout=ROUND_TIMEOUT), None)
+        if block is None:
             return None
 
-        return voc
+        samples = []
+        for values in block[1]:
+            status, voc, _ = engine.sensor.process(values)
+            if status != "OK":
+                continue
+            samples.append({
+                k: float(v) if v is not None and np.isfinite(v) else 0.0
+                for k, v in voc.items()
+            })
+
+        return samples or None
 
     except Exception as e:
         print("[SENSOR ERROR]", e)
@@ -57,8 +64,11 @@ def register_user(user_name: str, extra_biometrics: dict | None = None):
     print("[INFO] Starting registration")
 
     user_id = str(uuid.uuid4())[:8]
-    sensor = VOCSensor()
+    engine = get_acquisition()
+    engine.start()
+    get_flush_controller().ensure_baseline()
     voc_samples = []
+    round_features = []
 
     print(f"[INFO] Collecting {NUM_ROUNDS} rounds...")
 
@@ -66,55 +76,31 @@ def register_user(user_name: str, extra_biometrics: dict | None = None):
 
         print(f"[INFO] Round {round_idx + 1}/{NUM_ROUNDS}")
 
-        voc_data = safe_sensor_read(sensor)
+        samples = safe_round_read(engine)
 
-        if voc_data is None:
+        if samples is None:
             print("[WARNING] Skipping this round")
             continue
 
-        clean_data = {
-            k: float(v) if v is not None and np.isfinite(v) else 0.0
-            for k, v in voc_data.items()
-        }
-
-        voc_samples.append(clean_data)
+        voc_samples.extend(samples)
+        round_features.append(extract_features(samples))
 
         if round_idx < NUM_ROUNDS - 1:
             time.sleep(ROUND_DELAY)
 
-    if not voc_samples:
+    if not round_features:
         raise RuntimeError("No valid sensor data captured")
 
-    print("[INFO] Extracting features...")
-    feature_vector = extract_features(voc_samples)
-
-    embedding = generate_embedding(feature_vector)
-
-    conn = sqlite3.connect("voc_biometrics.db")
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT OR REPLACE INTO embeddings (user_id, embedding)
-        VALUES (?, ?)
-    """, (user_id, embedding.astype(np.float32).tobytes()))
-
-    conn.commit()
-    conn.close()
-
     print("[INFO] Storing user & features in DB...")
     insert_user(user_id, user_name)
-    insert_features(user_id, feature_vector)
-
-    try:
-        from sklearn.cluster import KMeans
-
-        X = np.array(list(feature_vector.values()), dtype=float).reshape(1, -1)
-        kmeans = KMeans(n_clusters=1, random_state=42).fit(X)
+    for round_no, features in enumerate(round_features, start=1):
+        store_features(user_id, features, round_no)
 
-        insert_kmeans_model(user_id, kmeans.cluster_centers_[0], 0.0)
+    # Identifiable through the embedding index right away, before any retraining
+    enroll_embeddings(user_id, round_features)
 
-    except Exception:
-        print("[INFO] Skipping local KMeans")
+    # One centroid per ROUNDS_PER_CENTROID rounds (up to three), threshold from the rounds' spread
+    enroll_templates(user_id, round_features)
 
     log_payload = {"voc": voc_samples}
 
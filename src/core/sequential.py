@@ -0,0 +1,168 @@
+"""
+Sequential early-exit verification.
+
+Instead of collecting every round and then calling verify_user, the capture
+loop hands each completed round to a SequentialVerifier. It scores the
+round right away and keeps, for every enrolled user, a cumulative
+log-likelihood ratio in the style of Wald's sequential probability ratio
+test:
+
+    llr[c] += log(p(c) / (1 - p(c))) - log(t / (1 - t))
+
+where p(c) is the round's fused ensemble probability for user c and t is
+the verification threshold (VOTE_THRESHOLD). A round more confident than t
+adds evidence for c, a less confident one removes it. With error rates
+alpha/beta the bounds are
+
+    accept  llr[top] >= log((1 - beta) / alpha)   and the fused confidence clears t
+    reject  llr[top] <= log(beta / (1 - alpha))   even the best candidate keeps missing t
+
+Nothing is decided before min_rounds; at max_rounds the decision falls
+back to the plain fused confidence, which is exactly what verify_user
+would have returned. The result dict has verify_user's shape.
+
+With VOC_TEMPLATES=prefilter the first min_rounds rounds are held back
+and screened against the centroid templates as one probe, as verify_user
+screens all its rounds. A probe that matches no template is rejected
+without running the ensemble; otherwise the held rounds are scored in one
+batch and the session continues round by round.
+"""
+import os
+
+import numpy as np
+
+from core.model_registry import get_registry
+from core.template_matcher import TEMPLATE_MODE
+from core.verification_controller import (
+    VOTE_THRESHOLD, apply_open_set, apply_templates, attach_timings, ensemble_members, feature_matrix,
+    flush_chamber, fuse_rounds, score, template_prefilter, template_rejection,
+)
+from utils.timing import span
+
+SEQ_ENABLED = os.environ.get("VOC_SEQUENTIAL", "1") != "0"
+SEQ_MIN_ROUNDS = int(os.environ.get("VOC_SEQ_MIN_ROUNDS", "5"))
+SEQ_ALPHA = 0.01        # accepted impostors
+SEQ_BETA = 0.01         # rejected genuine users
+PROB_CLIP = 0.01        # bounds one round's evidence to about +-3.8
+
+
+class SequentialVerifier:
+
+    def __init__(self, max_rounds, min_rounds=SEQ_MIN_ROUNDS, alpha=SEQ_ALPHA, beta=SEQ_BETA,
+                 threshold=VOTE_THRESHOLD / 100.0, models=None):
+        # One bundle for the whole session, even if a reload lands mid-capture
+        self.models = models if models is not None else get_registry().get()
+        self.max_rounds = int(max_rounds)
+        self.min_rounds = max(1, min(int(min_rounds), self.max_rounds))
+        self.threshold = threshold
+        self.accept_bound = np.log((1 - beta) / alpha)
+        self.reject_bound = np.log(beta / (1 - alpha))
+
+        self._member_probs = {}
+        self._rows = []             # feature rows, for the embedding lookup
+        self._rounds = []           # feature dicts, for the template matcher
+        self._stages = []           # cascade stage per scored round (None without a cascade)
+        self._screening = TEMPLATE_MODE == "prefilter"     # rounds held back for the template prefilter
+        self._matches = None
+        self.llr = None
+        self.decision = None        # "accept" / "reject" once a bound is crossed
+
+    @property
+    def rounds(self):
+        return len(self._rounds)
+
+    @property
+    def done(self):
+        return self.decision is not None or self.rounds >= self.max_rounds
+
+    def fused(self):
+        """Running fused probability over the rounds seen so far."""
+        per_round = np.nanmean([np.vstack(p) for p in self._member_probs.values()], axis=0)
+        return per_round.mean(axis=0)
+
+    def add_round(self, feature_dict):
+        """Score one round. Returns "accept", "reject" or "continue"."""
+        with span("sequential"):
+            return self._add_round(feature_dict)
+
+    def _score(self, X):
+        """Score feature rows and add them to the per-member probabilities and the LLR."""
+        member_probs, stages = score(X, self.models)
+        n_classes = next(iter(member_probs.values())).shape[1]
+        # A member the cascade skipped for a round, or for every round so far, gets NaN rows
+        for name in set(self._member_probs) | set(member_probs):
+            rows = self._member_probs.setdefault(name, [np.full(n_classes, np.nan)] * len(self._stages))
+            rows.extend(member_probs[name] if name in member_probs else np.full((len(X), n_classes), np.nan))
+        self._stages.extend(stages if stages is not None else [None] * len(X))
+
+        p = np.nanmean([probs for probs in member_probs.values()], axis=0)
+        p = np.clip(p, PROB_CLIP, 1 - PROB_CLIP)
+        evidence = (np.log(p / (1 - p)) - np.log(self.threshold / (1 - self.threshold))).sum(axis=0)
+        self.llr = evidence if self.llr is None else self.llr + evidence
+
+    def _release(self):
+        """Screen the held rounds against the templates; score them unless the probe is rejected."""
+        self._screening = False
+        with span("templates"):
+            self._matches, rejected = template_prefilter(self._rounds, self.models)
+        if rejected:
+            self.decision = "reject"
+            return
+        self._score(np.vstack(self._rows))
+
+    def _add_round(self, feature_dict):
+        X = feature_matrix([feature_dict], self.models["order"])
+        self._rows.append(X[0])
+        self._rounds.append(feature_dict)
+        if self._screening:
+            if self.rounds < self.min_rounds:
+                return "continue"
+            self._release()
+            if self.decision is not None:
+                return self.decision
+        else:
+            self._score(X)
+
+        if self.rounds < self.min_rounds:
+            return "continue"
+
+        fused = self.fused()
+        top = int(np.argmax(fused))
+        if self.llr[top] >= self.accept_bound and fused[top] >= self.threshold:
+            self.decision = "accept"
+        elif self.llr[top] <= self.reject_bound:
+            self.decision = "reject"
+        return self.decision or "continue"
+
+    def result(self):
+        """verify_user-style result for the rounds seen so far (no flush)."""
+        if self._screening and self._rounds:
+            self._release()     # capture ended before min_rounds
+        if self.decision == "reject" and not self._member_probs:
+            result = template_rejection(self._rounds, self.models, self._matches)
+            result["rounds_used"] = self.rounds
+            result["early_exit"] = self.decision
+            return attach_timings(result)
+        if not self._member_probs:
+            raise ValueError("no rounds scored")
+        member_probs = {name: np.vstack(self._member_probs[name])
+                        for name in ensemble_members(self.models) if name in self._member_probs}
+        stages = self._stages if any(s is not None for s in self._stages) else None
+        with span("fusion"):
+            result = fuse_rounds(member_probs, self.models, stages)
+        with span("embeddings"):
+            result = apply_open_set(result, np.vstack(self._rows), self.models)
+        with span("templates"):
+            result = apply_templates(result, self._rounds, self.models)
+        result["rounds_used"] = self.rounds
+        result["early_exit"] = self.decision
+        return attach_timings(result)
+
+    def finish(self):
+        """Final result; queues a chamber flush like verify_user does."""
+        result = self.result()
+
+        # FAN FLUSH AFTER VERIFICATION
+        flush_chamber()
+
+        return result
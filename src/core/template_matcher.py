@@ -0,0 +1,168 @@
+"""
+Per-user centroid templates for fast 1:N matching.
+
+At registration each user's rounds are clustered (k-means, up to
+TEMPLATE_CENTROIDS centroids) in a signed-log feature space,
+sign(x) * log1p(|x|), which keeps the raw features' very different scales
+from dominating. The centroids and a per-user distance threshold go into
+the kmeans_models table.
+
+TemplateMatcher loads every user's centroids into one contiguous matrix
+and scores a probe against all of them with a single matrix product
+(||c||^2 - 2 c.p + ||p||^2), reducing to the nearest centroid per user.
+Distances are RMS per feature, so thresholds do not depend on how many
+features a sensor mode has. Verification uses the ranking as a fallback
+for users the ensemble has not been trained on, and optionally as a
+pre-filter that skips the ensemble when nobody matches at all.
+"""
+import os
+import threading
+
+import numpy as np
+
+from database.model_dao import get_all_kmeans_models, insert_kmeans_model
+
+TEMPLATE_MODE = os.environ.get("VOC_TEMPLATES", "fallback").lower()     # off | fallback | prefilter
+TEMPLATE_CENTROIDS = 3
+ROUNDS_PER_CENTROID = 3         # fewer rounds than this per centroid would just memorize them
+THRESHOLD_MARGIN = 1.5          # x the farthest registration round from its own centroid
+MIN_THRESHOLD = float(os.environ.get("VOC_TEMPLATE_MIN_THRESHOLD", "0.05"))    # RMS signed-log units
+TEMPLATE_TOP_K = 3
+UNIQUE_RATIO = 0.8              # a match must be this much closer than the runner-up user
+
+
+def signed_log(X):
+    X = np.asarray(X, dtype=np.float64)
+    return np.sign(X) * np.log1p(np.abs(X))
+
+
+def _rms_distances(Z, centroids):
+    """RMS distance of every row of Z to every centroid, shape (rows, centroids)."""
+    d2 = (Z ** 2).sum(axis=1)[:, None] - 2 * Z @ centroids.T + (centroids ** 2).sum(axis=1)[None]
+    return np.sqrt(np.maximum(d2, 0) / Z.shape[1])
+
+
+def fit_template(X, max_centroids=TEMPLATE_CENTROIDS):
+    """(centroids, threshold) for one user's registration rounds (rows of raw features)."""
+    Z = signed_log(np.atleast_2d(X))
+    n_centroids = max(1, min(max_centroids, len(Z) // ROUNDS_PER_CENTROID))
+    if n_centroids == 1:
+        centroids = Z.mean(axis=0, keepdims=True)
+    else:
+        from sklearn.cluster import KMeans
+
+        centroids = KMeans(n_clusters=n_centroids, n_init=10, random_state=42).fit(Z).cluster_centers_
+
+    spread = _rms_distances(Z, centroids).min(axis=1).max()
+    return centroids.astype(np.float32), max(MIN_THRESHOLD, float(spread) * THRESHOLD_MARGIN)
+
+
+class TemplateMatcher:
+
+    def __init__(self):
+        self._templates = None      # loaded lazily, dropped by invalidate()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        rows = get_all_kmeans_models()
+        # Templates written for another feature layout (older sensor set) cannot be compared
+        orders = [tuple(order) for _, _, _, order in rows if order]
+        order = max(set(orders), key=orders.count) if orders else None
+        if order is not None:
+            # Legacy rows have no stored order; keep them only if their width fits
+            rows = [r for r in rows if tuple(r[3] or ()) == order or (not r[3] and r[1].shape[1] == len(order))]
+        if order is None or not rows:
+            return {"order": order, "user_ids": [], "centroids": np.empty((0, 0), np.float32)}
+
+        centroids = np.ascontiguousarray(np.vstack([c for _, c, _, _ in rows]), dtype=np.float32)
+        counts = [len(c) for _, c, _, _ in rows]
+        return {
+            "order": list(order),
+            "user_ids": [user_id for user_id, _, _, _ in rows],
+            "centroids": centroids,
+            "sq_norms": (centroids.astype(np.float64) ** 2).sum(axis=1),
+            "starts": np.concatenate([[0], np.cumsum(counts)[:-1]]),   # first centroid of each user
+            "thresholds": np.array([t for _, _, t, _ in rows], dtype=np.float64),
+        }
+
+    def _current(self):
+        templates = self._templates
+        if templates is None:
+            with self._lock:
+                if self._templates is None:
+                    self._templates = self._load()
+                templates = self._templates
+        return templates
+
+    def invalidate(self):
+        with self._lock:
+            self._templates = None
+
+    def user_ids(self):
+        return list(self._current()["user_ids"])
+
+    def match(self, round_feature_list):
+        """
+        Rank every user by the RMS distance of the probe (the mean of the
+        rounds in signed-log space) to their nearest centroid.
+        Returns [(user_id, distance, threshold), ...], closest first.
+        """
+        t = self._current()
+        if not t["user_ids"] or not round_feature_list:
+            return []
+
+        X = [[features.get(f, 0.0) for f in t["order"]] for features in round_feature_list]
+        probe = signed_log(X).mean(axis=0)
+        d2 = t["sq_norms"] - 2 * (t["centroids"] @ probe) + probe @ probe
+        per_user = np.sqrt(np.maximum(np.minimum.reduceat(d2, t["starts"]), 0) / len(probe))
+        ranked = np.argsort(per_user)
+        return [(t["user_ids"][i], float(per_user[i]), float(t["thresholds"][i])) for i in ranked]
+
+
+_matcher_instance = None
+
+
+def get_template_matcher():
+    global _matcher_instance
+
+    if _matcher_instance is None:
+        _matcher_instance = TemplateMatcher()
+
+    return _matcher_instance
+
+
+def invalidate_template_matcher():
+    if _matcher_instance is not None:
+        _matcher_instance.invalidate()
+
+
+def enroll_templates(user_id, round_feature_list):
+    """Fit and store a user's template from their registration round dicts. Returns the centroid count."""
+    if not round_feature_list:
+        return 0
+    order = list(round_feature_list[0])
+    X = np.array([[features.get(f, 0.0) for f in order] for features in round_feature_list], dtype=np.float64)
+    centroids, threshold = fit_template(X)
+    insert_kmeans_model(user_id, centroids, threshold, order)
+    invalidate_template_matcher()
+    return len(centroids)
+
+
+def rebuild_templates():
+    """Fit templates for every user with rounds in the features table."""
+    from database.feature_dao import get_all_features
+
+    order, rows = get_all_features()
+    by_user = {}
+    for user_id, values in rows:
+        by_user.setdefault(user_id, []).append(values)
+    for user_id, values in by_user.items():
+        centroids, threshold = fit_template(np.array(values))
+        insert_kmeans_model(user_id, centroids, threshold, order)
+    invalidate_template_matcher()
+    print(f"[TEMPLATES] Fitted templates for {len(by_user)} users")
+    return len(by_user)
+
+
+if __name__ == "__main__":
+    rebuild_templates()
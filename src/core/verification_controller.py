@@ -1,89 +1,194 @@
-import joblib
 import numpy as np
 import os
-import time
-from database.user_dao import get_user_name
-from sensors.fan_controller import FanController
+from database.user_directory import get_user_directory
+from sensors.fan_scheduler import get_fan_scheduler
+from core.model_registry import get_registry, load_bundle, MODELS_DIR
+from core.embedding import EMBEDDING_TOP_K, enroll, get_embedding_index
+from core.ensemble_executor import get_ensemble_executor
+from core.template_matcher import TEMPLATE_MODE, TEMPLATE_TOP_K, UNIQUE_RATIO, get_template_matcher
+from utils.timing import TIMINGS_ENABLED, Timeline, activate, current_timeline, record_models, span
 
 
+def load_latest_models():
+    """Read every model artifact from disk, bypassing the registry."""
+    return load_bundle(MODELS_DIR)
 
-from pathlib import Path
+FLUSH_DURATION = 30   # upper bound; the flush ends earlier once sensors are back at baseline
 
-SENSOR_MODE = int(os.environ.get("VOC_SENSOR_MODE", "6"))
-MODELS_DIR = Path(__file__).parent.parent.parent / "models" / f"{SENSOR_MODE}_sensors"
 
-def load_latest_models():
-    """Dynamically load models to ensure we fetch the latest trained weights and clear cache."""
+# ---------------- FAN FLUSH ----------------
+def flush_chamber():
+    """Queue a chamber flush and return its handle; the fan scheduler runs it in the background."""
+    return get_fan_scheduler().request_flush(FLUSH_DURATION, reason="verification")
+
+
+# ---------------- VERIFICATION ----------------
+VOTE_THRESHOLD = 70     # % confidence to verify, and for a member's vote to name a user
+
+# Cascade scoring: comma-separated stages tried before the full ensemble, members joined with "+",
+# e.g. VOC_CASCADE="DT+XGB,ANN" scores DT+XGB, then DT+XGB+ANN, then all five. Empty = always the
+# full ensemble. A lone DT is always 100% sure (pure leaves), so pair it with another member.
+CASCADE_SPEC = os.environ.get("VOC_CASCADE", "")
+CASCADE_MARGIN = float(os.environ.get("VOC_CASCADE_MARGIN", "0.5"))    # top-1 minus top-2 probability
+FULL_ENSEMBLE = "ENSEMBLE"
+
+
+def ensemble_members(models):
+    """Ensemble members as name -> callable(X) -> (rows x classes) probabilities."""
     return {
-        "rf": joblib.load(os.path.join(MODELS_DIR, "rf_model.pkl")),
-        "et": joblib.load(os.path.join(MODELS_DIR, "et_model.pkl")),
-        "dt": joblib.load(os.path.join(MODELS_DIR, "dt_model.pkl")),
-        "xgb": joblib.load(os.path.join(MODELS_DIR, "xgb_model.pkl")),
-        "ann": joblib.load(os.path.join(MODELS_DIR, "ann_model.pkl")),
-        "scaler": joblib.load(os.path.join(MODELS_DIR, "ann_scaler.pkl")),
-        "le": joblib.load(os.path.join(MODELS_DIR, "label_encoder.pkl")),
-        "order": joblib.load(os.path.join(MODELS_DIR, "feature_order.pkl"))
+        "RF": models["rf"].predict_proba,
+        "ET": models["et"].predict_proba,
+        "DT": models["dt"].predict_proba,
+        "XGB": models["xgb"].predict_proba,
+        "ANN": ann_predictor(models),
     }
 
-FLUSH_DURATION = 30
 
+def ann_predictor(models):
+    """Exported ANNs (ONNX, NumPy) already contain their scaler; the pickled MLP needs it applied first."""
+    if getattr(models["ann"], "includes_scaler", False):
+        return models["ann"].predict_proba
+    return lambda X: models["ann"].predict_proba(models["scaler"].transform(X))
 
-# ---------------- FAN FLUSH ----------------
-def flush_chamber():
-    print("\n[INFO] Waiting for hand removal before flushing...")
-    fan = FanController()
 
-    fan.flush(FLUSH_DURATION)
+def feature_matrix(round_feature_list, order):
+    """Stack per-round feature dicts into one (rounds x features) matrix in model order."""
+    return np.array([[feature_dict.get(f, 0.0) for f in order] for feature_dict in round_feature_list],
+                    dtype=np.float64).reshape(len(round_feature_list), len(order))
 
-    print("[INFO] Flushing completed\n")
 
+def score_rounds(X, models, timings=None):
+    """
+    Score every round with one call per member, members dispatched by the
+    ensemble executor. Returns name -> (rounds x classes); per-member wall
+    times (ms) go into `timings` when given.
+    """
+    outputs, member_ms = get_ensemble_executor().run(ensemble_members(models), X)
+    record_models(member_ms)
+    if timings is not None:
+        timings.update(member_ms)
+    return {name: np.asarray(probs) for name, probs in outputs.items()}
 
-# ---------------- VERIFICATION ----------------
-def verify_user(round_feature_list):
-    models = load_latest_models()
-    all_round_probs = []
-    detailed_votes = []
 
-    for round_idx, feature_dict in enumerate(round_feature_list):
+def parse_cascade(spec):
+    """Cumulative member lists per stage: "DT,XGB" -> [["DT"], ["DT", "XGB"]]."""
+    stages, members = [], []
+    for stage in filter(None, (part.strip() for part in spec.split(","))):
+        members = members + [m.strip().upper() for m in stage.split("+") if m.strip().upper() not in members]
+        stages.append(list(members))
+    return stages
+
 
-        X = np.array([[feature_dict.get(f, 0.0) for f in models["order"]]])
+CASCADE_STAGES = parse_cascade(CASCADE_SPEC)
 
-        probs = {}
 
-        probs["RF"]  = models["rf"].predict_proba(X)[0]
-        probs["ET"]  = models["et"].predict_proba(X)[0]
-        probs["DT"]  = models["dt"].predict_proba(X)[0]
-        probs["XGB"] = models["xgb"].predict_proba(X)[0]
+def score_rounds_cascade(X, models, stages=CASCADE_STAGES, margin=CASCADE_MARGIN, timings=None):
+    """
+    Score rounds stage by stage. Each stage adds members to the ones already
+    run; a round stops at the first stage whose members agree on the top
+    class and whose averaged probabilities put it at least `margin` ahead of
+    the runner-up. The full ensemble scores whatever is left. Member outputs
+    are never recomputed.
 
-        X_scaled = models["scaler"].transform(X)
-        probs["ANN"] = models["ann"].predict_proba(X_scaled)[0]
+    Returns (member_probs, stage_per_round). Rows a member did not score are NaN.
+    """
+    members = ensemble_members(models)
+    unknown = [m for stage in stages for m in stage if m not in members]
+    if unknown:
+        raise ValueError(f"Unknown cascade members {unknown}; expected {list(members)}")
 
-        # Average model probabilities for this round
-        round_prob = np.mean(list(probs.values()), axis=0)
-        all_round_probs.append(round_prob)
+    n = len(X)
+    member_probs = {}
+    stage_of = [FULL_ENSEMBLE] * n
+    pending = np.arange(n)
 
-        # Store detailed model votes
+    executor = get_ensemble_executor()
+    for stage in stages + [list(members)]:
+        new = {name: members[name] for name in stage if name not in member_probs}
+        outputs, member_ms = executor.run(new, X[pending])
+        record_models(member_ms)
+        for name, probs in outputs.items():
+            probs = np.asarray(probs)
+            member_probs[name] = np.full((n, probs.shape[1]), np.nan)
+            member_probs[name][pending] = probs
+        if timings is not None:
+            timings.update(member_ms)
+
+        if len(stage) == len(members):
+            break
+
+        stage_probs = np.stack([member_probs[name][pending] for name in stage])
+        avg = stage_probs.mean(axis=0)
+        top2 = np.sort(avg, axis=1)[:, -2:]
+        agree = (stage_probs.argmax(axis=2) == avg.argmax(axis=1)).all(axis=0)
+        decided = agree & (top2[:, 1] - top2[:, 0] >= margin)
+        label = "+".join(stage)
+        for r in pending[decided]:
+            stage_of[r] = label
+        pending = pending[~decided]
+        if not len(pending):
+            break
+
+    # Keep the usual member order for votes
+    ordered = {name: member_probs[name] for name in members if name in member_probs}
+    return ordered, stage_of
+
+
+def score(X, models, timings=None):
+    """Batched scoring through the cascade when VOC_CASCADE is set. Returns (member_probs, stages or None)."""
+    with span("inference"):
+        if CASCADE_STAGES:
+            return score_rounds_cascade(X, models, CASCADE_STAGES, CASCADE_MARGIN, timings)
+        return score_rounds(X, models, timings), None
+
+
+def round_votes(member_probs, le, stages=None):
+    """
+    Per-round, per-member vote structure from batched member probabilities.
+    Members that did not score a round (NaN rows from the cascade) are left out of its votes.
+    """
+    names = list(member_probs)
+    stacked = np.stack([member_probs[n] for n in names])        # members x rounds x classes
+    scored = ~np.isnan(stacked).any(axis=2)
+    top = np.where(scored, np.nan_to_num(stacked, nan=-1.0).argmax(axis=2), 0)
+    conf = np.array([[round(float(p) * 100, 2) for p in row]
+                     for row in np.nan_to_num(stacked.max(axis=2), nan=0.0)]).reshape(top.shape)
+
+    # Resolve each predicted user once, not once per round and member
+    voted = np.unique(top[conf >= VOTE_THRESHOLD])
+    user_ids = le.inverse_transform(voted) if len(voted) else []
+    user_names = get_user_directory().get_user_names(user_ids)
+    labels = {}
+    for idx, user_id in zip(voted, user_ids):
+        labels[idx] = f"{user_names[user_id] or 'Unknown Name'} (ID: {user_id})"
+
+    detailed_votes = []
+    for r in range(stacked.shape[1]):
         round_vote = {}
-        for model_name, prob in probs.items():
-            idx = np.argmax(prob)
-            conf = round(float(prob[idx] * 100), 2)
-
-            if conf >= 70:
-                model_pred_id = models["le"].inverse_transform([idx])[0]
-                model_pred_name = get_user_name(model_pred_id) or "Unknown Name"
-                user_label = f"{model_pred_name} (ID: {model_pred_id})"
-            else:
-                user_label = "No Data Found"
-                
+        for m, model_name in enumerate(names):
+            if not scored[m, r]:
+                continue
+            c = float(conf[m, r])
             round_vote[model_name] = {
-                "user_name": user_label,
-                "confidence": conf
+                "user_name": labels[top[m, r]] if c >= VOTE_THRESHOLD else "No Data Found",
+                "confidence": c
             }
-
-        detailed_votes.append({
-            "round": round_idx + 1,
+        detail = {
+            "round": r + 1,
             "votes": round_vote
-        })
+        }
+        if stages is not None:
+            detail["stage"] = stages[r]
+        detailed_votes.append(detail)
+    return detailed_votes
+
+
+def fuse_rounds(member_probs, models, stages=None):
+    """Result dict (without flushing) from batched member probabilities of every round."""
+    # Average model probabilities per round, over the members that scored it
+    stacked = np.stack([member_probs[n] for n in member_probs])
+    all_round_probs = np.nanmean(stacked, axis=0) if stages is not None else stacked.mean(axis=0)
+    detailed_votes = round_votes(member_probs, models["le"], stages)
 
     # Final fusion across all rounds
     fused_prob = np.mean(all_round_probs, axis=0)
@@ -93,15 +198,15 @@ def verify_user(round_feature_list):
 
     #final_name = models["le"].inverse_transform([final_index])[0]
     predict_user_id = models["le"].inverse_transform([final_index])[0]
-    predict_user_name = get_user_name(predict_user_id) or f"Unknown Name"
+    predict_user_name = get_user_directory().get_user_name(predict_user_id) or f"Unknown Name"
     
-    status = "VERIFIED" if final_confidence >= 70 else "NOT VERIFIED"
+    status = "VERIFIED" if final_confidence >= VOTE_THRESHOLD else "NOT VERIFIED"
 
     if status == "NOT VERIFIED":
         predict_user_name = "No Data Found"
         predict_user_id = "No Data Found"
 
-    result = {
+    return {
         "status": status,
         "user_name": predict_user_name,
         "user_id": predict_user_id,
@@ -109,8 +214,169 @@ def verify_user(round_feature_list):
         "round_details": detailed_votes
     }
 
+
+# ---------------- EMBEDDINGS ----------------
+def generate_embedding(features, models=None):
+    """
+    Embedding of a feature dict (or the mean embedding of a list of round
+    dicts). None while no projection has been trained.
+    """
+    models = models if models is not None else get_registry().get()
+    if models.get("embedding") is None:
+        return None
+    rounds = features if isinstance(features, (list, tuple)) else [features]
+    return models["embedding"].transform(feature_matrix(rounds, models["order"])).mean(axis=0)
+
+
+def enroll_embeddings(user_id, round_feature_list, models=None):
+    """Store and index the embeddings of a new user's rounds; identifiable at once. Returns the count."""
+    models = models if models is not None else get_registry().get()
+    if models.get("embedding") is None:
+        print("[EMBEDDING] No projection trained yet — skipping enrollment")
+        return 0
+    return len(enroll(user_id, feature_matrix(round_feature_list, models["order"]), models["embedding"]))
+
+
+def nearest_users(X, models, k=EMBEDDING_TOP_K):
+    """Top-k enrolled users nearest to the mean embedding of the rounds in X: [(user_id, distance), ...]."""
+    if models.get("embedding") is None or not len(X):
+        return []
+    embedding = models["embedding"].transform(X).mean(axis=0)
+    return get_embedding_index().query(embedding, models["embedding"], k)
+
+
+def apply_open_set(result, X, models):
+    """
+    Add the nearest enrolled users to a result. If the ensemble did not
+    verify anyone and the nearest user is one it was never trained on, lying
+    within the projection's radius, verify that user from the embedding.
+    """
+    neighbours = nearest_users(X, models)
+    names = get_user_directory().get_user_names([user_id for user_id, _ in neighbours])
+    result["neighbours"] = [{"user_id": user_id, "user_name": names[user_id] or "Unknown Name",
+                             "distance": round(d, 4)} for user_id, d in neighbours]
+    if result["status"] == "VERIFIED" or not neighbours:
+        return result
+
+    user_id, distance = neighbours[0]
+    radius = models["embedding"].radius
+    known = {str(c) for c in models["le"].classes_}
+    if str(user_id) not in known and distance <= radius:
+        result.update({
+            "status": "VERIFIED",
+            "user_id": user_id,
+            "user_name": names[user_id] or "Unknown Name",
+            # 100% at the enrolled rounds, VOTE_THRESHOLD exactly at the radius
+            "confidence": round(100 - (100 - VOTE_THRESHOLD) * distance / radius, 2),
+            "method": "embedding",
+        })
+    return result
+
+
+# ---------------- TEMPLATES ----------------
+def _template_confidence(distance, threshold):
+    # 100% on a centroid, VOTE_THRESHOLD exactly at the user's threshold
+    return round(100 - (100 - VOTE_THRESHOLD) * distance / threshold, 2)
+
+
+def apply_templates(result, round_feature_list, models, matches=None):
+    """
+    Add the closest centroid templates to a result. If nobody was verified
+    so far and the closest template belongs to a user the ensemble was never
+    trained on, is within that user's threshold and is clearly closer than
+    the runner-up, verify that user.
+    """
+    if TEMPLATE_MODE == "off":
+        return result
+    if matches is None:
+        matches = get_template_matcher().match(round_feature_list)
+    names = get_user_directory().get_user_names([user_id for user_id, _, _ in matches[:TEMPLATE_TOP_K]])
+    result["templates"] = [{"user_id": user_id, "user_name": names[user_id] or "Unknown Name",
+                            "distance": round(d, 4), "match": d <= threshold}
+                           for user_id, d, threshold in matches[:TEMPLATE_TOP_K]]
+    if result["status"] == "VERIFIED" or not matches:
+        return result
+
+    user_id, distance, threshold = matches[0]
+    known = {str(c) for c in models["le"].classes_}
+    unique = len(matches) == 1 or distance <= UNIQUE_RATIO * matches[1][1]
+    if str(user_id) not in known and distance <= threshold and unique:
+        result.update({
+            "status": "VERIFIED",
+            "user_id": user_id,
+            "user_name": names[user_id] or "Unknown Name",
+            "confidence": _template_confidence(distance, threshold),
+            "method": "template",
+        })
+    return result
+
+
+def template_prefilter(round_feature_list, models):
+    """
+    (matches, rejected). With VOC_TEMPLATES=prefilter and a template for
+    every user the ensemble knows, a probe that matches no template at all
+    is rejected without running the ensemble.
+    """
+    if TEMPLATE_MODE == "off":
+        return None, False
+    matcher = get_template_matcher()
+    matches = matcher.match(round_feature_list)
+    if TEMPLATE_MODE != "prefilter" or not matches:
+        return matches, False
+    covered = {str(c) for c in models["le"].classes_} <= {str(u) for u in matcher.user_ids()}
+    return matches, covered and all(d > threshold for _, d, threshold in matches)
+
+
+def template_rejection(round_feature_list, models, matches):
+    """Result for a probe the template prefilter rejected."""
+    return apply_templates({
+        "status": "NOT VERIFIED",
+        "user_name": "No Data Found",
+        "user_id": "No Data Found",
+        "confidence": 0.0,
+        "round_details": [],
+        "method": "template",
+    }, round_feature_list, models, matches)
+
+
+def attach_timings(result):
+    """result["timings"]: stage / member / round breakdown of the active timeline."""
+    timeline = current_timeline()
+    if timeline is not None:
+        result["timings"] = timeline.as_dict()
+    return result
+
+
+def verify_user(round_feature_list):
+    # A capture session has its own timeline active; a standalone call gets a fresh one
+    timeline = current_timeline() or (Timeline() if TIMINGS_ENABLED else None)
+    with activate(timeline):
+        with span("verify"):
+            result = _verify(round_feature_list)
+        return attach_timings(result)
+
+
+def _verify(round_feature_list):
+    # Served from memory; reloaded in the background when training writes new artifacts
+    models = get_registry().get()
+
+    with span("templates"):
+        matches, rejected = template_prefilter(round_feature_list, models)
+    if rejected:
+        result = template_rejection(round_feature_list, models, matches)
+        flush_chamber()
+        return result
+
+    X = feature_matrix(round_feature_list, models["order"])
+    member_probs, stages = score(X, models)
+    with span("fusion"):
+        result = fuse_rounds(member_probs, models, stages)
+    with span("embeddings"):
+        result = apply_open_set(result, X, models)
+    with span("templates"):
+        result = apply_templates(result, round_feature_list, models, matches)
+
     # FAN FLUSH AFTER VERIFICATION
     flush_chamber()
 
     return result
-
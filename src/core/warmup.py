@@ -0,0 +1,120 @@
+"""
+Background warm-up of the verification path.
+
+The first verification after launch would otherwise pay for loading the
+model bundle (and the sklearn/xgboost imports its pickles pull in), the
+first calls into XGBoost and BLAS, and the first users-table read. The GUI
+starts a Warmup when it opens: it loads the bundle through the registry,
+scores a dummy batch with every member (one row, as a sequential round is
+scored, and a full batch, as verify_user scores), and primes the user
+directory, the centroid templates and the embedding index. Listeners are
+told when it is ready, so the dashboard can show it.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from core.embedding import get_embedding_index
+from core.model_registry import get_registry
+from core.template_matcher import get_template_matcher
+from core.verification_controller import score, score_rounds
+from database.user_directory import get_user_directory
+from utils import timing
+
+WARMUP_ENABLED = os.environ.get("VOC_WARMUP", "1") != "0"
+WARMUP_BATCH = 50       # rows in the batched pass; matches a full capture
+
+PENDING = "pending"
+WARMING = "warming up"
+READY = "ready"
+FAILED = "failed"
+
+
+class Warmup:
+
+    def __init__(self, batch=WARMUP_BATCH):
+        self.batch = batch
+        self.state = PENDING
+        self.timings = {}           # step -> seconds
+        self.error = None
+
+        self._ready = threading.Event()
+        self._listeners = []
+        self._thread = None
+
+    def start(self):
+        """Run the warm-up on a daemon thread (once). Returns self."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="voc-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until the warm-up finished (or failed). Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    # ---------------- STATE LISTENERS ----------------
+    def on_state_change(self, callback):
+        """Call `callback(warmup)` on every state change; called at once with the current state."""
+        self._listeners.append(callback)
+        callback(self)
+        return callback
+
+    def _set_state(self, state):
+        self.state = state
+        for callback in list(self._listeners):
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"[WARMUP ERROR] {e}")
+
+    # ---------------- WORKER ----------------
+    def _step(self, name, func):
+        t0 = time.perf_counter()
+        result = func()
+        self.timings[name] = time.perf_counter() - t0
+        return result
+
+    def _run(self):
+        self._set_state(WARMING)
+        try:
+            models = self._step("models", get_registry().get)
+            n_features = len(models["order"])
+            # Every member once per batch shape; the cascade path too when it is configured
+            self._step("first_round", lambda: score(np.zeros((1, n_features)), models))
+            self._step("first_batch", lambda: score_rounds(np.zeros((self.batch, n_features)), models))
+            self._step("users", get_user_directory().all_users)
+            self._step("templates", get_template_matcher().user_ids)
+            if models.get("embedding") is not None:
+                self._step("embeddings", lambda: get_embedding_index().ensure(models["embedding"]))
+        except Exception as e:
+            self.error = str(e)
+            print(f"[WARMUP] Failed, first verification will load on demand: {e}")
+            self._ready.set()
+            self._set_state(FAILED)
+            return
+
+        # The cold first calls would dominate the rolling latency percentiles
+        timing.reset()
+        steps = ", ".join(f"{name} {sec * 1000:.0f} ms" for name, sec in self.timings.items())
+        print(f"[WARMUP] Verification ready in {self.total:.2f}s ({steps})")
+        self._ready.set()
+        self._set_state(READY)
+
+
+_warmup_instance = None
+
+
+def get_warmup():
+    global _warmup_instance
+
+    if _warmup_instance is None:
+        _warmup_instance = Warmup()
+
+    return _warmup_instance
@@ -0,0 +1,80 @@
+"""
+Shared SQLite connections.
+
+Every thread (GUI, capture session, warm-up, model reload) gets one
+long-lived connection from get_connection() instead of connecting per
+statement. Connections run in WAL mode, so readers never wait on the
+writer and a feedback write does not stall the GUI's lookups, with
+synchronous=NORMAL (durable at every checkpoint, no fsync per commit),
+memory-mapped reads and a busy timeout for the rare writer-writer
+overlap. Because a connection now outlives each DAO call, its
+prepared-statement cache does too: a repeated statement is compiled once
+per thread instead of once per call. sqlite3's default cache of 128
+statements already holds the ~20 distinct ones the DAOs issue;
+VOC_DB_CACHED_STATEMENTS overrides it.
+
+The schema (tables and legacy-column migrations, see db_init) is checked
+once per process, on the first connection, rather than in every DAO call.
+
+    conn = get_connection()
+    with conn:              # commits, or rolls back on error
+        conn.execute(...)
+"""
+import os
+import sqlite3
+import threading
+
+from database.config import DB_PATH
+
+DB_MMAP_SIZE = int(os.environ.get("VOC_DB_MMAP_MB", "64")) * 1024 * 1024
+DB_CACHED_STATEMENTS = int(os.environ.get("VOC_DB_CACHED_STATEMENTS", "128"))     # sqlite3's default
+DB_BUSY_TIMEOUT = 5.0       # seconds a writer waits for another writer's lock
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={DB_MMAP_SIZE}",
+)
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect():
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, cached_statements=DB_CACHED_STATEMENTS)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _ensure_schema(conn):
+    global _schema_ready
+
+    with _schema_lock:
+        if not _schema_ready:
+            from database.db_init import create_tables, default_feature_columns
+
+            with conn:
+                create_tables(conn.cursor(), default_feature_columns())
+            _schema_ready = True
+
+
+def get_connection():
+    """This thread's connection, opened (and the schema checked) on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _connect()
+        if not _schema_ready:
+            _ensure_schema(conn)
+        _local.conn = conn
+    return conn
+
+
+def close_connection():
+    """Close this thread's connection; the next get_connection() opens a new one."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
@@ -1,21 +1,32 @@
 """
 Non-destructive database initializer.
-Creates all tables if they don't exist. Safe to run multiple times.
+Creates all tables if they don't exist and adds columns missing from
+older databases. Safe to run multiple times; the connection manager runs
+it once per process on the first connection.
 """
 import sqlite3
-import os
 from database.config import DB_PATH
-from core.feature_extractor import extract_features
+from database.connection import get_connection
+from core.feature_extractor import feature_names
 
+SENSOR_KEYS = ["mq6_1", "mq135_1", "mq137_1", "mems_nh3_1", "mems_ethanol_1", "mems_odor_1"]
+
+# Columns added after the first release: (table, column definition)
+MIGRATIONS = [
+    ("users", "registered_at TEXT"),
+    ("kmeans_models", "n_centroids INTEGER DEFAULT 1"),      # multi-centroid templates
+    ("kmeans_models", "feature_order TEXT"),
+    ("embeddings", "feature_layout TEXT"),                   # hash of the feature order of `features`
+]
+
+
+def default_feature_columns():
+    """Feature columns of the full sensor set."""
+    return feature_names(SENSOR_KEYS)
 
-def init_db(feature_columns=None):
-    """Initialize all database tables non-destructively (CREATE IF NOT EXISTS)."""
-    
-    # Ensure the data directory exists
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+
+def create_tables(cur, feature_columns=None):
+    """CREATE IF NOT EXISTS every table, then apply MIGRATIONS to existing ones."""
 
     # ── Users Table ──
     cur.execute("""
@@ -64,25 +75,50 @@ def init_db(feature_columns=None):
         )
     """)
 
-    conn.commit()
-    conn.close()
+    # ── Embeddings Table (one row per enrolled round) ──
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            embedding BLOB,
+            features BLOB,
+            projection TEXT,
+            feature_layout TEXT,
+            created_at TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        )
+    """)
+
+    # ── Per-user centroid templates ──
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS kmeans_models (
+            user_id TEXT PRIMARY KEY,
+            centroid BLOB,
+            threshold REAL,
+            n_centroids INTEGER DEFAULT 1,
+            feature_order TEXT
+        )
+    """)
+
+    # ── Columns missing from older databases ──
+    for table, column in MIGRATIONS:
+        try:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+
+def init_db(feature_columns=None):
+    """Initialize all database tables non-destructively (CREATE IF NOT EXISTS)."""
+    conn = get_connection()
+    with conn:
+        create_tables(conn.cursor(), feature_columns)
     print(f"[DB] All tables initialized (non-destructive) at {DB_PATH}")
 
 
 def ensure_all_tables():
     """Quick call to ensure every table exists. Safe to call at startup."""
-    # Generate feature columns from a dummy sample
-    dummy_sample = [{
-        "mq6_1": 0.0,
-        "mq135_1": 0.0,
-        "mq137_1": 0.0,
-        "mems_nh3_1": 0.0,
-        "mems_ethanol_1": 0.0,
-        "mems_odor_1": 0.0,
-    }]
-    feature_dict = extract_features(dummy_sample)
-    feature_columns = list(feature_dict.keys())
-    init_db(feature_columns)
+    init_db(default_feature_columns())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import numpy as np
+
+from database.connection import get_connection
+from utils.timing import timed
+
+
+@timed("db.insert_embeddings")
+def insert_embeddings(user_id, embeddings, features, projection, feature_layout=None):
+    """One row per enrolled round: its embedding and the raw feature vector it came from."""
+    now = datetime.now().isoformat()
+    conn = get_connection()
+    with conn:
+        conn.executemany("""
+            INSERT INTO embeddings (user_id, embedding, features, projection, feature_layout, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(user_id, np.asarray(e, dtype=np.float32).tobytes(), np.asarray(f, dtype=np.float32).tobytes(),
+               projection, feature_layout, now) for e, f in zip(embeddings, features)])
+
+
+@timed("db.get_all_embeddings")
+def get_all_embeddings():
+    """[(id, user_id, embedding, features, projection, feature_layout), ...] with float32 vectors."""
+    cur = get_connection().execute(
+        "SELECT id, user_id, embedding, features, projection, feature_layout FROM embeddings")
+    return [(row_id, user_id, np.frombuffer(embedding, dtype=np.float32),
+             np.frombuffer(features, dtype=np.float32), projection, feature_layout)
+            for row_id, user_id, embedding, features, projection, feature_layout in cur.fetchall()]
+
+
+def update_embeddings(rows, projection):
+    """Replace the embedding of each (id, embedding) after the projection changed."""
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE embeddings SET embedding=?, projection=? WHERE id=?",
+                         [(np.asarray(e, dtype=np.float32).tobytes(), projection, row_id) for row_id, e in rows])
+
+
+def set_feature_layout(row_ids, feature_layout):
+    """Record the feature layout of rows stored before layouts were."""
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE embeddings SET feature_layout=? WHERE id=?",
+                         [(feature_layout, row_id) for row_id in row_ids])
+
+
+def delete_embeddings(user_id):
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM embeddings WHERE user_id=?", (user_id,))
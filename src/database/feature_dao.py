@@ -1,12 +1,12 @@
-import sqlite3
+import json
+from datetime import datetime
 
-from database.config import DB_PATH
+from database.connection import get_connection
+from utils.timing import timed
 
 
+@timed("db.store_features")
 def store_features(user_id, feature_dict, round_no):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
     columns = list(feature_dict.keys())
     values = [float(feature_dict[col]) for col in columns]
     placeholders = ",".join(["?"] * (len(values) + 2))
@@ -16,19 +16,16 @@ def store_features(user_id, feature_dict, round_no):
         (user_id, round_no, {",".join(columns)})
         VALUES ({placeholders})
     """
-    cur.execute(query, [user_id, round_no] + values)
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute(query, [user_id, round_no] + values)
 
+@timed("db.store_feedback")
 def store_feedback(user_id, predicted_id, predicted_name, confidence, reward, feature_dict):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
     columns = list(feature_dict.keys())
     values = [float(feature_dict[col]) for col in columns]
-    placeholders = ",".join(["?"] * (len(values) + 5))
+    placeholders = ",".join(["?"] * (len(values) + 6))
     
-    from datetime import datetime
     timestamp = datetime.now().isoformat()
 
     query = f"""
@@ -37,55 +34,27 @@ def store_feedback(user_id, predicted_id, predicted_name, confidence, reward, fe
         VALUES ({placeholders})
     """
     
-    cur.execute(query, [user_id, predicted_id, predicted_name, confidence, reward, timestamp] + values)
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute(query, [user_id, predicted_id, predicted_name, confidence, reward, timestamp] + values)
 
 def store_radar_profile(user_id, user_name, radar_plot_path, registration_readings):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS radar_profiles (
-            user_id TEXT PRIMARY KEY,
-            user_name TEXT,
-            radar_plot_path TEXT,
-            registration_readings TEXT
-        )
-    """)
-    
-    import json
     readings_json = json.dumps(registration_readings)
     
-    cur.execute("""
-        INSERT OR REPLACE INTO radar_profiles 
-        (user_id, user_name, radar_plot_path, registration_readings)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, user_name, radar_plot_path, readings_json))
-    
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO radar_profiles 
+            (user_id, user_name, radar_plot_path, registration_readings)
+            VALUES (?, ?, ?, ?)
+        """, (user_id, user_name, radar_plot_path, readings_json))
 
 def get_radar_profile(user_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
-    # Ensure table exists (backward compatibility with old databases)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS radar_profiles (
-            user_id TEXT PRIMARY KEY,
-            user_name TEXT,
-            radar_plot_path TEXT,
-            registration_readings TEXT
-        )
-    """)
-    
-    cur.execute("SELECT user_name, radar_plot_path, registration_readings FROM radar_profiles WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
+    row = get_connection().execute(
+        "SELECT user_name, radar_plot_path, registration_readings FROM radar_profiles WHERE user_id=?", (user_id,)
+    ).fetchone()
     
     if row:
-        import json
         return {
             "user_name": row[0],
             "radar_plot_path": row[1],
@@ -93,3 +62,14 @@ def get_radar_profile(user_id):
         }
     return None
 
+
+def get_all_features():
+    """(feature columns, [(user_id, [values...]), ...]) for every stored round."""
+    cur = get_connection().execute("SELECT * FROM features")
+    columns = [c[0] for c in cur.description]
+    rows = cur.fetchall()
+
+    user_col = columns.index("user_id")
+    feature_cols = [i for i, c in enumerate(columns) if c not in ("id", "user_id", "round_no")]
+    return ([columns[i] for i in feature_cols],
+            [(row[user_col], [0.0 if row[i] is None else float(row[i]) for i in feature_cols]) for row in rows])
@@ -1,40 +1,45 @@
-import sqlite3
 import numpy as np
-from database.config import DB_PATH
+from database.connection import get_connection
+from utils.timing import timed
 
 
-def insert_kmeans_model(user_id, centroid, threshold):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+@timed("db.insert_kmeans_model")
+def insert_kmeans_model(user_id, centroid, threshold, feature_order=None):
+    """Store a user's template: one centroid (1-D) or several (n_centroids x features)."""
+    centroids = np.atleast_2d(np.asarray(centroid, dtype=np.float32))
+    order = ",".join(feature_order) if feature_order is not None else None
 
-    centroid_blob = centroid.astype(np.float32).tobytes()
+    conn = get_connection()
+    with conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO kmeans_models (user_id, centroid, threshold, n_centroids, feature_order)
+            VALUES (?, ?, ?, ?, ?)
+        """, (user_id, centroids.tobytes(), float(threshold), len(centroids), order))
 
-    cur.execute("""
-        INSERT OR REPLACE INTO kmeans_models (user_id, centroid, threshold)
-        VALUES (?, ?, ?)
-    """, (user_id, centroid_blob, float(threshold)))
 
-    conn.commit()
-    conn.close()
+def _row_to_model(centroid, threshold, n_centroids, feature_order):
+    centroids = np.frombuffer(centroid, dtype=np.float32).reshape(int(n_centroids or 1), -1)
+    order = feature_order.split(",") if feature_order else None
+    return centroids, threshold, order
 
 
 def get_kmeans_model(user_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT centroid, threshold
+    """(centroids (n_centroids x features), threshold, feature order or None), or None."""
+    row = get_connection().execute("""
+        SELECT centroid, threshold, n_centroids, feature_order
         FROM kmeans_models
         WHERE user_id = ?
-    """, (user_id,))
-
-    row = cur.fetchone()
-    conn.close()
+    """, (user_id,)).fetchone()
 
     if row is None:
         return None
 
-    centroid = np.frombuffer(row[0], dtype=np.float32)
-    threshold = row[1]
+    return _row_to_model(*row)
+
 
-    return centroid, threshold
+@timed("db.get_all_kmeans_models")
+def get_all_kmeans_models():
+    """[(user_id, centroids, threshold, feature order or None), ...]"""
+    cur = get_connection().execute(
+        "SELECT user_id, centroid, threshold, n_centroids, feature_order FROM kmeans_models")
+    return [(row[0], *_row_to_model(*row[1:])) for row in cur.fetchall()]
@@ -1,55 +1,29 @@
-import sqlite3
 from datetime import datetime
-from database.config import DB_PATH
+from database.connection import get_connection
+from database.user_directory import invalidate_user_directory
+from utils.timing import timed
 
 
+@timed("db.insert_user")
 def insert_user(user_id, user_name):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    conn = get_connection()
+    with conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO users (user_id, name, registered_at)
+            VALUES (?, ?, ?)
+        """, (user_id, user_name, datetime.now().isoformat()))
 
-    # Ensure users table exists (backward compatibility)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id TEXT PRIMARY KEY,
-            name TEXT,
-            registered_at TEXT
-        )
-    """)
-
-    # Add registered_at column if table was created without it (old schema)
-    try:
-        cur.execute("ALTER TABLE users ADD COLUMN registered_at TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-
-    cur.execute("""
-        INSERT OR REPLACE INTO users (user_id, name, registered_at)
-        VALUES (?, ?, ?)
-    """, (user_id, user_name, datetime.now().isoformat()))
-
-    conn.commit()
-    conn.close()
+    # Cached id -> name lookups reload on next use
+    invalidate_user_directory()
 
 
+@timed("db.get_all_users")
 def get_all_users():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("SELECT user_id, name FROM users")
-    rows = cur.fetchall()
-
-    conn.close()
-    return rows
+    return get_connection().execute("SELECT user_id, name FROM users").fetchall()
 
 
 def get_user_name(user_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("SELECT name FROM users WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-
-    conn.close()
+    row = get_connection().execute("SELECT name FROM users WHERE user_id=?", (user_id,)).fetchone()
     
     if row:
         return row[0]
@@ -0,0 +1,72 @@
+"""
+In-memory directory of registered users.
+
+Loads the users table once and serves id -> name lookups from a dict, so
+scoring and screen redraws never touch SQLite. insert_user() invalidates
+the directory; the next lookup reloads it.
+"""
+import sqlite3
+import threading
+
+from utils.timing import span
+
+
+class UserDirectory:
+
+    def __init__(self):
+        self._names = None      # user_id (str) -> name, None until loaded
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from database.user_dao import get_all_users
+
+        try:
+            with span("users.load"):
+                rows = get_all_users()
+        except sqlite3.OperationalError:
+            rows = []       # users table not created yet
+        return {str(user_id): name for user_id, name in rows}
+
+    def _directory(self):
+        names = self._names
+        if names is None:
+            with self._lock:
+                if self._names is None:
+                    self._names = self._load()
+                names = self._names
+        return names
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+
+    def get_user_name(self, user_id):
+        with span("users.lookup"):
+            return self._directory().get(str(user_id))
+
+    def get_user_names(self, user_ids):
+        """{user_id: name or None} for every id, in one pass."""
+        with span("users.lookup"):
+            names = self._directory()
+            return {user_id: names.get(str(user_id)) for user_id in user_ids}
+
+    def all_users(self):
+        """[(user_id, name), ...] like user_dao.get_all_users()."""
+        return list(self._directory().items())
+
+
+_directory_instance = None
+
+
+def get_user_directory():
+    global _directory_instance
+
+    if _directory_instance is None:
+        _directory_instance = UserDirectory()
+
+    return _directory_instance
+
+
+def invalidate_user_directory():
+    if _directory_instance is not None:
+        _directory_instance.invalidate()
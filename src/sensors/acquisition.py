@@ -0,0 +1,202 @@
+"""
+Background acquisition engine.
+
+A dedicated thread owns the I2C bus and sweeps every ADS1115 channel at a
+fixed rate into a preallocated ring buffer. Column 0 holds the sample
+timestamp, the remaining columns hold one raw voltage per channel in
+CHANNELS order (NaN where the read failed).
+
+The buffer has a single writer. Readers never take a lock: the writer fills
+a row first and only then publishes it by bumping the sample counter, and
+readers re-check the counter after copying to detect rows that were
+overwritten underneath them.
+"""
+import os
+import threading
+
+import numpy as np
+
+from sensors.backend import SystemClock
+from utils.timing import span
+from sensors.sensor_reader import VOCSensor, CHANNEL_LABELS
+
+SAMPLE_RATE_HZ = float(os.environ.get("VOC_SAMPLE_RATE", "5.0"))   # 0 = sweep as fast as the ADCs allow
+BUFFER_CAPACITY = 4096
+MIN_SWEEP_INTERVAL = 0.001  # seconds yielded between free-running sweeps, so a read that fails fast cannot spin
+
+
+class AcquisitionEngine:
+
+    def __init__(self, sensor=None, rate_hz=SAMPLE_RATE_HZ, capacity=BUFFER_CAPACITY):
+        self.sensor = sensor if sensor is not None else VOCSensor()
+        self.clock = getattr(self.sensor, "clock", None) or SystemClock()
+        self.labels = list(CHANNEL_LABELS)
+        self.rate_hz = float(rate_hz)
+        if not self.rate_hz >= 0:
+            raise ValueError(f"Sample rate must be >= 0 Hz (0 = as fast as the ADCs allow), got {rate_hz}")
+        self.capacity = int(capacity)
+
+        self._buf = np.full((self.capacity, 1 + len(self.labels)), np.nan)
+        self._count = 0        # total rows ever published
+        self.overruns = 0      # sweeps that started later than one period behind schedule
+
+        self._stop = threading.Event()
+        self._new_data = threading.Condition()
+        self._thread = None
+
+    # ---------------- LIFECYCLE ----------------
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="voc-acquisition", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def count(self):
+        """Total number of samples published since start-up."""
+        return self._count
+
+    # ---------------- WRITER ----------------
+    def _run(self):
+        period = 1.0 / self.rate_hz if self.rate_hz > 0 else 0.0
+        next_t = self.clock.monotonic()
+
+        while not self._stop.is_set():
+            ts = self.clock.monotonic()
+            try:
+                with span("sensor.read"):
+                    values = self.sensor.read_voltages()
+            except Exception as e:
+                print(f"[ACQ ERROR] {e}")
+                values = np.full(len(self.labels), np.nan)
+
+            self._publish(ts, values)
+            if period == 0.0:
+                self.clock.wait(self._stop, MIN_SWEEP_INTERVAL)
+                continue
+
+            # Schedule against absolute deadlines so timing errors never accumulate
+            next_t += period
+            delay = next_t - self.clock.monotonic()
+            if delay > 0:
+                self.clock.wait(self._stop, delay)
+            elif -delay > period:
+                self.overruns += 1
+                next_t = self.clock.monotonic()
+
+    def _publish(self, ts, values):
+        row = self._buf[self._count % self.capacity]
+        row[0] = ts
+        row[1:] = values
+        self._count += 1
+
+        with self._new_data:
+            self._new_data.notify_all()
+
+    # ---------------- READERS ----------------
+    def _copy(self, start, stop):
+        """Copy published rows [start, stop) out of the ring, or None if they were overwritten."""
+        idx = np.arange(start, stop) % self.capacity
+        block = self._buf[idx]
+        # The slot after the newest row may be mid-write, so one row less is safe
+        if self._count - start >= self.capacity:
+            return None
+        return block
+
+    def snapshot(self, n=None):
+        """
+        Return (timestamps, values) for the most recent n samples
+        (all buffered samples when n is None), oldest first.
+        """
+        while True:
+            end = self._count
+            n_avail = min(end, self.capacity - 1)
+            n_rows = n_avail if n is None else min(int(n), n_avail)
+            block = self._copy(end - n_rows, end)
+            if block is not None:
+                return block[:, 0], block[:, 1:]
+
+    def sample_rates(self, n=None):
+        """
+        Achieved samples/second per channel over the most recent n samples
+        (whole buffer by default). Failed reads do not count.
+        """
+        ts, values = self.snapshot(n)
+        if len(ts) < 2 or ts[-1] <= ts[0]:
+            return {label: 0.0 for label in self.labels}
+
+        # n samples span n-1 intervals
+        duration = (ts[-1] - ts[0]) * len(ts) / (len(ts) - 1)
+        counts = np.isfinite(values).sum(axis=0)
+        return {label: float(c / duration) for label, c in zip(self.labels, counts)}
+
+    def iter_blocks(self, block_size=1, timeout=None, gate=None):
+        """
+        Yield (timestamps, values) blocks of exactly block_size new samples,
+        starting from the next sample published once iteration begins.
+
+        A reader that falls more than a buffer behind skips ahead to the
+        oldest sample still held. Iteration ends when the engine is stopped
+        or when no block arrives within timeout seconds.
+
+        With a `gate` (a HandController) the reader pauses while the chamber
+        is empty: it sleeps in gate.wait_for_hand() and resumes from the first
+        sample taken after the hand is back. Blocks that overlap a removal are
+        dropped, so every yielded sample was taken with a hand in place.
+        """
+        cursor = self._count
+
+        while True:
+            if gate is not None and not gate.hand_present():
+                while not gate.wait_for_hand(0.5):
+                    if self._stop.is_set():
+                        return
+                cursor = self._count
+
+            deadline = None if timeout is None else self.clock.monotonic() + timeout
+
+            with self._new_data:
+                while self._count - cursor < block_size:
+                    if self._stop.is_set():
+                        return
+                    remaining = None if deadline is None else deadline - self.clock.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return
+                    self.clock.wait(self._new_data, remaining if remaining is not None else 0.5)
+
+            if self._count - cursor >= self.capacity:
+                cursor = self._count - self.capacity + 1
+
+            block = self._copy(cursor, cursor + block_size)
+            if block is None:
+                continue
+            cursor += block_size
+
+            if gate is not None:
+                since = gate.present_since
+                if since is None or block[0, 0] < since:
+                    continue
+            yield block[:, 0], block[:, 1:]
+
+
+_engine_instance = None
+
+
+def get_acquisition():
+    global _engine_instance
+
+    if _engine_instance is None:
+        _engine_instance = AcquisitionEngine()
+
+    return _engine_instance
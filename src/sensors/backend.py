@@ -0,0 +1,110 @@
+"""
+Pluggable hardware backends for the sensor drivers.
+
+VOCSensor, HandController, FanController and FingerprintSensor never import
+board/busio/adafruit/gpiozero/pyfingerprint themselves; they ask the active
+backend for device objects and for a clock. The hardware backend imports the
+Raspberry Pi libraries lazily, so every module under sensors/ can be imported
+on any machine.
+
+Select the backend with VOC_BACKEND:
+    hardware  (default) real I2C / GPIO / UART devices
+    sim       replayed or synthetic sessions on a virtual clock
+              (see sensors/sim_backend.py)
+"""
+import os
+import time
+
+BACKEND_NAME = os.environ.get("VOC_BACKEND", "hardware").lower()
+
+
+class SystemClock:
+    """Wall-clock time. The simulated backend swaps in a VirtualClock."""
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, waitable, timeout=None):
+        """Wait on a threading.Event/Condition with a timeout in clock seconds."""
+        return waitable.wait(timeout)
+
+
+class HardwareBackend:
+    name = "hardware"
+
+    def __init__(self):
+        self.clock = SystemClock()
+
+    # ---------- I2C / ADC ----------
+    def i2c(self):
+        import board
+        import busio
+        return busio.I2C(board.SCL, board.SDA)
+
+    def ads1115(self, i2c, address):
+        from adafruit_ads1x15.ads1115 import ADS1115
+        return ADS1115(i2c, address=address)
+
+    def analog_in(self, ads, pin):
+        from adafruit_ads1x15.analog_in import AnalogIn
+        return AnalogIn(ads, pin)
+
+    def ads_mode(self, continuous):
+        from adafruit_ads1x15.ads1x15 import Mode
+        return Mode.CONTINUOUS if continuous else Mode.SINGLE
+
+    # ---------- DHT ----------
+    def dht11(self):
+        import board
+        import adafruit_dht
+        return adafruit_dht.DHT11(board.D4, use_pulseio=False)
+
+    # ---------- GPIO ----------
+    def digital_input(self, pin, **kwargs):
+        from gpiozero import DigitalInputDevice
+        return DigitalInputDevice(pin, **kwargs)
+
+    def digital_output(self, pin, **kwargs):
+        from gpiozero import DigitalOutputDevice
+        return DigitalOutputDevice(pin, **kwargs)
+
+    def led(self, pin):
+        from gpiozero import LED
+        return LED(pin)
+
+    # ---------- Fingerprint ----------
+    def fingerprint(self):
+        from pyfingerprint.pyfingerprint import PyFingerprint
+        return PyFingerprint('/dev/serial0', 57600, 0xFFFFFFFF, 0x00000000)
+
+
+_backend_instance = None
+
+
+def get_backend():
+    global _backend_instance
+
+    if _backend_instance is None:
+        if BACKEND_NAME == "sim":
+            from sensors.sim_backend import SimulatedBackend
+            _backend_instance = SimulatedBackend.from_env()
+        elif BACKEND_NAME == "hardware":
+            _backend_instance = HardwareBackend()
+        else:
+            raise ValueError(f"Unknown VOC_BACKEND '{BACKEND_NAME}' (expected 'hardware' or 'sim')")
+
+    return _backend_instance
+
+
+def set_backend(backend):
+    """Install a backend explicitly (benchmarks, scripted simulations)."""
+    global _backend_instance
+    _backend_instance = backend
+    return backend
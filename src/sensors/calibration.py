@@ -0,0 +1,126 @@
+"""
+Vectorized MQ / MEMS calibration.
+
+Converts whole blocks of raw ADC voltages (samples x channels, CHANNELS
+order) to ppm in one NumPy pass using per-channel coefficient arrays.
+Failed or out-of-range conversions come back as NaN rather than None.
+
+Raw voltages are what the acquisition engine stores, so ppm can be
+re-derived at any time with different constants, e.g.
+
+    cal = Calibration.load("calibration.json", CHANNELS)
+    ppm = cal.to_ppm(engine.snapshot()[1])
+"""
+import json
+
+import numpy as np
+
+# ---------- Calibration defaults ----------
+RL = 10000
+VC = 5.0
+
+RO = {
+    "mq135": 3000,
+    "mq137": 3500,
+    "mq6": 5000
+}
+
+# log10(ppm) = slope * log10(Rs/Ro) + intercept
+MQ_CURVES = {
+    "mq6":   (-0.47, 1.68),
+    "mq135": (-0.42, 2.3),
+    "mq137": (-0.35, 1.9),
+}
+
+MEMS_MAX_PPM = {
+    "nh3": 300,
+    "ethanol": 500,
+    "odor": 50
+}
+
+MEMS_VREF = 5.0
+MIN_MQ_VOLTAGE = 0.01   # below this the MQ load resistor reading is treated as a dead channel
+
+
+class Calibration:
+
+    def __init__(self, channels, rl=RL, vc=VC, ro=RO, curves=MQ_CURVES, mems_max_ppm=MEMS_MAX_PPM):
+        self.labels = [c[0] for c in channels]
+        types = [c[3] for c in channels]
+        n = len(types)
+
+        self.is_mq = np.array([t in curves for t in types])
+        self.rl = np.full(n, float(rl))
+        self.vc = np.full(n, float(vc))
+        self.ro = np.array([ro[t] if t in curves else np.nan for t in types], dtype=float)
+        self.slope = np.array([curves[t][0] if t in curves else np.nan for t in types], dtype=float)
+        self.intercept = np.array([curves[t][1] if t in curves else np.nan for t in types], dtype=float)
+        self.max_ppm = np.array([np.nan if t in curves else mems_max_ppm.get(t, 100) for t in types], dtype=float)
+
+    # ---------------- FORWARD ----------------
+    def to_ppm(self, voltages):
+        """
+        voltages : array (..., channels) of raw ADC voltages
+        returns  : float64 array of the same shape in ppm, NaN where invalid
+        """
+        v = np.asarray(voltages, dtype=float)
+
+        with np.errstate(all="ignore"):
+            # MQ: Rs from the load-resistor divider, then the log-log datasheet curve
+            rs = (self.vc - v) / v * self.rl
+            rs = np.where(v > MIN_MQ_VOLTAGE, rs, np.nan)
+            mq_ppm = 10 ** (self.slope * np.log10(rs / self.ro) + self.intercept)
+
+            # MEMS: linear over the full-scale range
+            mems_ppm = np.round(v / MEMS_VREF * self.max_ppm, 2)
+
+        ppm = np.where(self.is_mq, mq_ppm, mems_ppm)
+        ppm[~np.isfinite(ppm)] = np.nan
+        return ppm
+
+    # ---------------- INVERSE ----------------
+    def to_voltage(self, ppm, index=None):
+        """
+        Inverse of to_ppm. With `index`, ppm holds values for that single
+        channel; otherwise the last axis runs over all channels.
+        """
+        sl = slice(None) if index is None else index
+        p = np.asarray(ppm, dtype=float)
+
+        with np.errstate(all="ignore"):
+            rs = 10 ** ((np.log10(p) - self.intercept[sl]) / self.slope[sl]) * self.ro[sl]
+            mq_v = np.where(p > 0, self.vc[sl] * self.rl[sl] / (rs + self.rl[sl]), 0.0)
+            mems_v = p / self.max_ppm[sl] * MEMS_VREF
+
+        return np.where(self.is_mq[sl], mq_v, mems_v)
+
+    # ---------------- PERSISTENCE ----------------
+    def to_dict(self):
+        return {
+            "labels": self.labels,
+            "rl": self.rl.tolist(),
+            "vc": self.vc.tolist(),
+            "ro": self.ro.tolist(),
+            "slope": self.slope.tolist(),
+            "intercept": self.intercept.tolist(),
+            "max_ppm": self.max_ppm.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data, channels):
+        cal = cls(channels)
+        if data.get("labels", cal.labels) != cal.labels:
+            raise ValueError("Calibration channels do not match the current sensor mode")
+        for key in ("rl", "vc", "ro", "slope", "intercept", "max_ppm"):
+            if key in data:
+                setattr(cal, key, np.array(data[key], dtype=float))
+        return cal
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path, channels):
+        with open(path) as f:
+            return cls.from_dict(json.load(f), channels)
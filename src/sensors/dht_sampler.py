@@ -0,0 +1,77 @@
+"""
+Low-rate background sampler for the DHT11.
+
+Temperature and humidity barely move during a session, but a single DHT11
+read can fail and be retried for over a second. The sampler polls the
+sensor on its own thread and publishes the last good reading together with
+its age, so VOCSensor never blocks on it.
+"""
+import os
+import threading
+
+DHT_INTERVAL = float(os.environ.get("VOC_DHT_INTERVAL", "5.0"))
+DHT_RETRY_DELAY = 2.0   # DHT11 needs ~1-2 s between attempts
+
+
+class DHTSampler:
+
+    def __init__(self, device, clock, interval=DHT_INTERVAL):
+        self.device = device
+        self.clock = clock
+        self.interval = interval
+
+        # (temperature, humidity, timestamp), replaced as a whole so readers never see a torn value
+        self._latest = None
+        self.failures = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="voc-dht", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _read_once(self):
+        try:
+            t = self.device.temperature
+            h = self.device.humidity
+        except RuntimeError:
+            return None     # routine DHT11 checksum/timing miss
+        except Exception as e:
+            # Driver/bus errors (e.g. OSError) must not end the thread; latest() would go stale
+            print(f"[DHT ERROR] {e}")
+            return None
+        if t is None or h is None:
+            return None
+        return round(t, 2), round(h, 2)
+
+    def _run(self):
+        while not self._stop.is_set():
+            reading = self._read_once()
+            if reading is not None:
+                self._latest = (reading[0], reading[1], self.clock.monotonic())
+                delay = self.interval
+            else:
+                self.failures += 1
+                delay = DHT_RETRY_DELAY
+            self.clock.wait(self._stop, delay)
+
+    def latest(self):
+        """
+        Return (temperature, humidity, age_seconds) of the last good reading.
+        Before the first successful read this is (0.0, 0.0, None).
+        """
+        latest = self._latest
+        if latest is None:
+            return 0.0, 0.0, None
+        t, h, ts = latest
+        return t, h, self.clock.monotonic() - ts
@@ -1,15 +1,17 @@
-from gpiozero import DigitalOutputDevice
-import time
+from sensors.backend import get_backend
 
 # Use BCM numbering
 FAN_PIN = 24   # Change if needed
 
 class FanController:
 
-    def __init__(self):
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else get_backend()
+        self.clock = self.backend.clock
+
         # active_high=False → because your relay is active LOW
         # initial_value=True → keep relay OFF at startup
-        self.fan = DigitalOutputDevice(
+        self.fan = self.backend.digital_output(
             FAN_PIN,
             active_high=False,
             initial_value=False
@@ -29,7 +31,7 @@ class FanController:
         then turn it OFF.
         """
         self.turn_on()
-        time.sleep(duration)
+        self.clock.sleep(duration)
         self.turn_off()
 '''      
 if __name__=="__main__":
@@ -0,0 +1,120 @@
+"""
+Fan scheduler: the single owner of the flush fan.
+
+Callers never run the fan themselves. They call request_flush(), which
+returns a FlushJob handle at once while a worker thread runs the
+closed-loop flush (FlushController). A request that arrives while a flush
+is pending or running is merged into it by extending its bounds, so
+overlapping requests never toggle the relay against each other.
+
+The scheduler reports its state ("idle" / "flushing") to listeners such as
+the GUI, and wait_until_clean() lets the next capture block only while a
+flush is still in progress.
+"""
+import threading
+
+from sensors.flush_controller import FlushJob, FLUSH_MIN_DURATION, get_flush_controller
+
+IDLE = "idle"
+FLUSHING = "flushing"
+
+
+class FanScheduler:
+
+    def __init__(self, flush_controller):
+        self.flush_controller = flush_controller
+        self.clock = flush_controller.clock
+
+        self._lock = threading.Condition()
+        self._job = None            # pending or running job
+        self.last_result = None
+        self._listeners = []
+
+        self._thread = threading.Thread(target=self._run, name="voc-fan-scheduler", daemon=True)
+        self._thread.start()
+
+    # ---------------- REQUESTS ----------------
+    def request_flush(self, max_duration, min_duration=FLUSH_MIN_DURATION, reason=""):
+        """Queue a flush, or extend the current one. Returns its FlushJob without blocking."""
+        with self._lock:
+            job = self._job
+            if job is not None and job.extend(max_duration, min_duration):
+                print(f"[FAN] Flush request merged ({reason or 'unspecified'}, {job.requests} requests)")
+                return job
+
+            job = FlushJob(self.clock, max_duration, min_duration)
+            self._job = job
+            self._lock.notify_all()
+        print(f"[FAN] Flush requested ({reason or 'unspecified'}, up to {max_duration:.0f}s)")
+        self._notify(FLUSHING)
+        return job
+
+    @property
+    def state(self):
+        return FLUSHING if self._job is not None else IDLE
+
+    @property
+    def current_job(self):
+        return self._job
+
+    def wait_until_clean(self, timeout=None):
+        """
+        Block while a flush is pending or running. Returns True once the fan
+        is idle, False on timeout. Returns immediately when nothing is queued.
+        """
+        deadline = None if timeout is None else self.clock.monotonic() + timeout
+        while True:
+            job = self._job
+            if job is None or job.done:
+                return True
+            remaining = None if deadline is None else deadline - self.clock.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            job.wait(remaining)
+
+    # ---------------- STATE LISTENERS ----------------
+    def on_state_change(self, callback):
+        """Call `callback(state)` whenever the scheduler goes idle or starts flushing."""
+        self._listeners.append(callback)
+        return callback
+
+    def _notify(self, state):
+        for callback in list(self._listeners):
+            try:
+                callback(state)
+            except Exception as e:
+                print(f"[FAN ERROR] {e}")
+
+    # ---------------- WORKER ----------------
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._job is None:
+                    self._lock.wait()
+                job = self._job
+
+            try:
+                self.last_result = self.flush_controller.run_job(job)
+            except Exception as e:
+                print(f"[FAN ERROR] Flush failed: {e}")
+                self.flush_controller.fan.turn_off()
+                while not job.close(*job.bounds()):
+                    pass
+                job.finish({"duration": 0.0, "settled": False, "error": str(e)})
+
+            with self._lock:
+                if self._job is job:
+                    self._job = None
+            self._notify(self.state)
+
+
+_scheduler_instance = None
+
+
+def get_fan_scheduler():
+    global _scheduler_instance
+
+    if _scheduler_instance is None:
+        _scheduler_instance = FanScheduler(get_flush_controller())
+
+    return _scheduler_instance
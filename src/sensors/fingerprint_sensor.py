@@ -2,19 +2,20 @@ import os
 from datetime import datetime
 from PIL import Image
 
-try:
-    from pyfingerprint.pyfingerprint import PyFingerprint
-except ImportError:
-    print("pyfingerprint library not found. Install using: pip install pyfingerprint")
+from sensors.backend import get_backend
 
 class FingerprintSensor:
-    def __init__(self):
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else get_backend()
         try:
             #sensor = PyFingerprint('COM3', 57600, 0xFFFFFFFF, 0x00000000)
-            self.f = PyFingerprint('/dev/serial0', 57600, 0xFFFFFFFF, 0x00000000)
+            self.f = self.backend.fingerprint()
             if not self.f.verifyPassword():
                 raise ValueError('Fingerprint sensor password is wrong!')
             print('Fingerprint sensor initialized.')
+        except ImportError:
+            print("pyfingerprint library not found. Install using: pip install pyfingerprint")
+            self.f = None
         except Exception as e:
             print('Failed to initialize fingerprint sensor:', e)
             self.f = None
@@ -0,0 +1,211 @@
+"""
+Closed-loop chamber flush.
+
+Runs the flush fan while watching the live acquisition stream and stops as
+soon as every channel has stayed within tolerance of its clean-air baseline
+for a settle window. The old fixed flush durations survive only as bounds:
+the fan always runs at least `min_duration` and never longer than
+`max_duration`.
+
+The clean-air baseline is the per-channel median of the most recent
+clean-chamber captures: the idle chamber at start-up and the tail of every
+flush that settled. A flush that hit `max_duration` may still hold dirty
+air and leaves the baseline as it was. Until a baseline exists the flush
+simply runs to `max_duration`, which is the previous fixed-time behaviour.
+"""
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+from sensors.fan_manager import get_fan
+from sensors.acquisition import get_acquisition
+from utils.timing import span
+
+FLUSH_MIN_DURATION = float(os.environ.get("VOC_FLUSH_MIN", "5"))
+FLUSH_TOLERANCE = 0.05          # relative deviation allowed from baseline
+FLUSH_ABS_TOLERANCE = 0.01      # volts; floor for channels that sit near 0 V
+SETTLE_WINDOW = 3.0             # seconds every channel must stay in tolerance
+BASELINE_WINDOW = 3.0           # seconds of clean air per baseline capture
+BASELINE_HISTORY = 5            # captures kept for the rolling baseline
+POLL_INTERVAL = 0.5
+
+
+class FlushController:
+
+    def __init__(self, fan, engine, tolerance=FLUSH_TOLERANCE, abs_tolerance=FLUSH_ABS_TOLERANCE,
+                 settle_window=SETTLE_WINDOW):
+        self.fan = fan
+        self.engine = engine
+        self.clock = engine.clock
+        self.tolerance = tolerance
+        self.abs_tolerance = abs_tolerance
+        self.settle_window = settle_window
+
+        self._captures = deque(maxlen=BASELINE_HISTORY)
+        self.baseline = None
+
+    # ---------------- BASELINE ----------------
+    def _recent(self, seconds):
+        """Samples from the last `seconds` of the acquisition stream, or None if it has gone quiet."""
+        if not self.engine.running:
+            return None
+        ts, values = self.engine.snapshot()
+        if len(ts) < 2:
+            return None
+
+        now = self.clock.monotonic()
+        mask = ts >= now - seconds
+        # Require the window to actually be covered by samples
+        if mask.sum() < 2 or ts[mask][-1] - ts[mask][0] < 0.8 * seconds:
+            return None
+        return values[mask]
+
+    def capture_baseline(self, seconds=BASELINE_WINDOW):
+        """Record the current chamber air as clean. Call only when the chamber is known to be clean."""
+        values = self._recent(seconds)
+        if values is None:
+            return False
+
+        with np.errstate(all="ignore"):
+            capture = np.nanmedian(values, axis=0)
+        self._captures.append(capture)
+        with np.errstate(all="ignore"):
+            self.baseline = np.nanmedian(np.vstack(self._captures), axis=0)
+        return True
+
+    def ensure_baseline(self):
+        """Capture a first baseline from the idle chamber if none exists yet."""
+        if self.baseline is None:
+            self.capture_baseline()
+        return self.baseline is not None
+
+    def is_clean(self):
+        """True when every live channel stayed within tolerance of baseline for the settle window."""
+        if self.baseline is None:
+            return False
+        values = self._recent(self.settle_window)
+        if values is None:
+            return False
+
+        tol = np.maximum(self.tolerance * np.abs(self.baseline), self.abs_tolerance)
+        live = np.isfinite(self.baseline)
+        with np.errstate(invalid="ignore"):
+            within = np.abs(values - self.baseline) <= tol
+        # Dead channels (NaN in the window) neither pass nor block the check
+        within |= ~np.isfinite(values)
+        return bool(live.any() and within[:, live].all())
+
+    # ---------------- FLUSH ----------------
+    def flush(self, max_duration, min_duration=FLUSH_MIN_DURATION):
+        """
+        Run the fan until the chamber is back at baseline, bounded by
+        [min_duration, max_duration] seconds. Returns a small summary dict.
+        """
+        return self.run_job(FlushJob(self.clock, max_duration, min_duration))
+
+    def run_job(self, job):
+        """
+        Blocking flush driven by a FlushJob, whose bounds may be extended
+        while it runs. Marks the job done with the summary dict.
+        """
+        job.started = self.clock.monotonic()
+        settled = False
+
+        with span("flush"):
+            self.fan.turn_on()
+            try:
+                while True:
+                    now = self.clock.monotonic()
+                    min_until, max_until = job.bounds()
+                    if now >= max_until:
+                        if job.close(min_until, max_until):
+                            break
+                        continue
+                    if now >= min_until and self.is_clean():
+                        # A request merged in meanwhile may have raised the minimum
+                        if job.close(min_until, max_until):
+                            settled = True
+                            break
+                        continue
+                    self.clock.sleep(min(POLL_INTERVAL, max_until - now))
+            finally:
+                self.fan.turn_off()
+
+            # Only air that settled is clean; after a flush cut off at max_duration keep the old baseline
+            if settled:
+                self.capture_baseline(self.settle_window)
+
+        elapsed = self.clock.monotonic() - job.started
+        print(f"[FLUSH] {'Settled' if settled else 'Max duration'} after {elapsed:.1f}s")
+        result = {"duration": elapsed, "settled": settled}
+        job.finish(result)
+        return result
+
+
+class FlushJob:
+    """
+    One flush request. Its bounds are absolute clock times so that a later
+    overlapping request can extend a flush that is already running.
+    """
+
+    def __init__(self, clock, max_duration, min_duration=FLUSH_MIN_DURATION):
+        self.clock = clock
+        now = clock.monotonic()
+        self._lock = threading.Lock()
+        self._min_until = now + min(min_duration, max_duration)
+        self._max_until = now + max_duration
+        self.requests = 1
+        self.started = None
+        self.result = None
+        self._closed = False
+        self._done = threading.Event()
+
+    def bounds(self):
+        with self._lock:
+            return self._min_until, self._max_until
+
+    def extend(self, max_duration, min_duration=FLUSH_MIN_DURATION):
+        """Merge another request into this job. Returns False once the job is finishing."""
+        now = self.clock.monotonic()
+        with self._lock:
+            if self._closed:
+                return False
+            self._min_until = max(self._min_until, now + min(min_duration, max_duration))
+            self._max_until = max(self._max_until, now + max_duration)
+            self.requests += 1
+            return True
+
+    def close(self, min_until, max_until):
+        """Stop accepting extensions, unless the bounds moved since they were read."""
+        with self._lock:
+            if (min_until, max_until) != (self._min_until, self._max_until):
+                return False
+            self._closed = True
+            return True
+
+    def finish(self, result):
+        with self._lock:
+            self.result = result
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the flush finished. Returns False on timeout."""
+        return self.clock.wait(self._done, timeout)
+
+
+_flush_instance = None
+
+
+def get_flush_controller():
+    global _flush_instance
+
+    if _flush_instance is None:
+        _flush_instance = FlushController(get_fan(), get_acquisition())
+
+    return _flush_instance
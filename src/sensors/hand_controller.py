@@ -1,22 +1,127 @@
-from gpiozero import DigitalInputDevice, DigitalOutputDevice, LED
-import time
+"""
+Chamber hand detection and sampling indicators.
+
+The IR sensor is edge-driven: gpiozero's when_activated/when_deactivated
+callbacks feed a debounced presence state, so callers either register
+on_hand_placed/on_hand_removed callbacks or block in wait_for_hand() /
+wait_for_removal() instead of polling hand_present().
+"""
+import threading
+
+from sensors.backend import get_backend
 
 IR_PIN = 17
 FAN_PIN = 16
 LED1_PIN = 1
 LED2_PIN = 12
 
+HAND_DEBOUNCE = 0.05    # seconds the IR level must hold before an edge counts
+
+
 class HandController:
-    def __init__(self):
-        self.ir = DigitalInputDevice(IR_PIN, pull_up=False)
-        self.fan = DigitalOutputDevice(FAN_PIN, active_high=False, initial_value=True)
-        self.led1 = LED(LED1_PIN)
-        self.led2 = LED(LED2_PIN)
+    def __init__(self, backend=None, debounce=HAND_DEBOUNCE):
+        self.backend = backend if backend is not None else get_backend()
+        self.clock = self.backend.clock
+        self.debounce = debounce
 
-    def hand_present(self):
+        self.ir = self.backend.digital_input(IR_PIN, pull_up=False, bounce_time=debounce or None)
+        self.fan = self.backend.digital_output(FAN_PIN, active_high=False, initial_value=True)
+        self.led1 = self.backend.led(LED1_PIN)
+        self.led2 = self.backend.led(LED2_PIN)
+
+        self._placed = threading.Event()
+        self._removed = threading.Event()
+        self._placed_callbacks = []
+        self._removed_callbacks = []
+        self._lock = threading.Lock()
+        self._edge_seen = threading.Event()
+        # Clock time the current hand was placed, None while the chamber is empty
+        self.present_since = None
+
+        self._publish(self._ir_hand())
+        if self.debounce:
+            # One long-lived debounce thread; edges only restart its quiet window
+            threading.Thread(target=self._debounce_loop, name="voc-hand-debounce", daemon=True).start()
+        self.ir.when_activated = self._on_edge
+        self.ir.when_deactivated = self._on_edge
+
+    # ---------------- STATE ----------------
+    def _ir_hand(self):
         # IR LOW = hand detected
         return not self.ir.is_active
 
+    def hand_present(self):
+        """Debounced hand presence."""
+        return self._placed.is_set()
+
+    def _on_edge(self):
+        if not self.debounce:
+            self._publish(self._ir_hand())
+            return
+        self._edge_seen.set()
+
+    def _debounce_loop(self):
+        while True:
+            self._edge_seen.wait()
+            # Publish once the level has held for a full window; a later edge restarts it
+            while True:
+                self._edge_seen.clear()
+                if not self.clock.wait(self._edge_seen, self.debounce):
+                    break
+            self._publish(self._ir_hand())
+
+    def _publish(self, present):
+        with self._lock:
+            if present and self._placed.is_set():
+                return
+            if not present and self._removed.is_set():
+                return
+
+            if present:
+                self.present_since = self.clock.monotonic()
+                self._removed.clear()
+                self._placed.set()
+                callbacks = list(self._placed_callbacks)
+            else:
+                self.present_since = None
+                self._placed.clear()
+                self._removed.set()
+                callbacks = list(self._removed_callbacks)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[HAND ERROR] {e}")
+
+    # ---------------- EVENTS ----------------
+    def on_hand_placed(self, callback):
+        """Call `callback()` each time a hand is placed. Returns the callback for remove_callback()."""
+        with self._lock:
+            self._placed_callbacks.append(callback)
+        return callback
+
+    def on_hand_removed(self, callback):
+        """Call `callback()` each time the hand is removed. Returns the callback for remove_callback()."""
+        with self._lock:
+            self._removed_callbacks.append(callback)
+        return callback
+
+    def remove_callback(self, callback):
+        with self._lock:
+            for callbacks in (self._placed_callbacks, self._removed_callbacks):
+                if callback in callbacks:
+                    callbacks.remove(callback)
+
+    def wait_for_hand(self, timeout=None):
+        """Block until a hand is in the chamber. Returns False on timeout."""
+        return self.clock.wait(self._placed, timeout)
+
+    def wait_for_removal(self, timeout=None):
+        """Block until the chamber is empty. Returns False on timeout."""
+        return self.clock.wait(self._removed, timeout)
+
+    # ---------------- INDICATORS ----------------
     def start_sampling(self):
         self.fan.off()
         self.led1.on()
@@ -1,13 +1,12 @@
-import time
-import math
 import warnings
 import os
-import busio, board
-from adafruit_ads1x15.ads1115 import ADS1115
-from adafruit_ads1x15.analog_in import AnalogIn
-import adafruit_dht
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+from sensors.backend import get_backend
+from sensors.calibration import Calibration, RL, VC, RO, MQ_CURVES, MEMS_MAX_PPM
+from sensors.dht_sampler import DHTSampler
+
 warnings.filterwarnings("ignore")
 
 MAX_IO_ERRORS = 3
@@ -16,17 +15,63 @@ MIN_VARIANCE_THRESHOLD = 0.01
 SENSOR_MODE = int(os.environ.get("VOC_SENSOR_MODE", "6"))
 MIN_ACTIVE_SENSORS = 8 if SENSOR_MODE == 12 else 4
 
+# ---------- Channel map ----------
+# (label, ADC attribute, pin, sensor type) in the order readings are reported.
+# Feature names and the trained models depend on this order.
+if SENSOR_MODE == 12:
+    CHANNELS = [
+        ("mq6_1",          "ads1", 0, "mq6"),
+        ("mq135_1",        "ads1", 1, "mq135"),
+        ("mq137_1",        "ads1", 2, "mq137"),
+        ("mq6_2",          "ads2", 2, "mq6"),
+        ("mq135_2",        "ads2", 3, "mq135"),
+        ("mq137_2",        "ads3", 0, "mq137"),
+        ("mems_nh3_1",     "ads1", 3, "nh3"),
+        ("mems_ethanol_1", "ads2", 0, "ethanol"),
+        ("mems_odor_1",    "ads2", 1, "odor"),
+        ("mems_nh3_2",     "ads3", 1, "nh3"),
+        ("mems_ethanol_2", "ads3", 2, "ethanol"),
+        ("mems_odor_2",    "ads3", 3, "odor"),
+    ]
+else:
+    CHANNELS = [
+        ("mq6_1",          "ads1", 0, "mq6"),
+        ("mq135_1",        "ads1", 1, "mq135"),
+        ("mq137_1",        "ads1", 2, "mq137"),
+        ("mems_nh3_1",     "ads1", 3, "nh3"),
+        ("mems_ethanol_1", "ads2", 0, "ethanol"),
+        ("mems_odor_1",    "ads2", 1, "odor"),
+    ]
+
+CHANNEL_LABELS = [c[0] for c in CHANNELS]
+
+ADS_ADDRESSES = {"ads1": 0x48, "ads2": 0x49, "ads3": 0x4B}
+
+# Optional JSON file overriding the calibration defaults (see sensors/calibration.py)
+CALIBRATION_FILE = os.environ.get("VOC_CALIBRATION")
+
+# ---------- ADS1115 sampling mode ----------
+ADS_DATA_RATES = (8, 16, 32, 64, 128, 250, 475, 860)
+ADS_DATA_RATE = int(os.environ.get("VOC_ADS_DATA_RATE", "0")) or None   # None = driver default (128 SPS)
+ADS_CONTINUOUS = os.environ.get("VOC_ADS_CONTINUOUS", "0") == "1"
+ADS_INTERLEAVE = os.environ.get("VOC_ADS_INTERLEAVE", "1") == "1"
+
+
 class VOCSensor:
-    def __init__(self):
+    def __init__(self, backend=None):
+
+        self.backend = backend if backend is not None else get_backend()
+        self.clock = self.backend.clock
+        AnalogIn = self.backend.analog_in
 
         # ---------- I2C ----------
-        self.i2c = busio.I2C(board.SCL, board.SDA)
+        self.i2c = self.backend.i2c()
 
         # ---------- ADC Modules ----------
-        self.ads1 = ADS1115(self.i2c, address=0x48)
-        self.ads2 = ADS1115(self.i2c, address=0x49)
+        self.ads1 = self.backend.ads1115(self.i2c, ADS_ADDRESSES["ads1"])
+        self.ads2 = self.backend.ads1115(self.i2c, ADS_ADDRESSES["ads2"])
         if SENSOR_MODE == 12:
-            self.ads3 = ADS1115(self.i2c, address=0x4B)
+            self.ads3 = self.backend.ads1115(self.i2c, ADS_ADDRESSES["ads3"])
 
         # ---------- ADS1 ----------
         self.mq6_1      = AnalogIn(self.ads1, 0)
@@ -50,69 +95,61 @@ class VOCSensor:
             self.mems_odor_2    = AnalogIn(self.ads3, 3)
 
         # ---------- Calibration ----------
-        self.RL = 10000
-        self.VC = 5.0
+        if CALIBRATION_FILE:
+            self.calibration = Calibration.load(CALIBRATION_FILE, CHANNELS)
+        else:
+            self.calibration = Calibration(CHANNELS, RL, VC, RO, MQ_CURVES, MEMS_MAX_PPM)
 
-        self.RO = {
-            "mq135": 3000,
-            "mq137": 3500,
-            "mq6": 5000
-        }
+        # ---------- DHT ----------
+        self.dhtDevice = self.backend.dht11()
+        self.dht = DHTSampler(self.dhtDevice, self.clock)
+        self.dht.start()
 
-        self.MEMS_MAX_PPM = {
-            "nh3": 300,
-            "ethanol": 500,
-            "odor": 50
-        }
+        # Channel objects in CHANNELS order (used for whole-sweep reads)
+        self.channels = [(label, getattr(self, label), typ) for label, _, _, typ in CHANNELS]
 
-        # ---------- DHT ----------
-        self.dhtDevice = adafruit_dht.DHT11(board.D4, use_pulseio=False)
+        # Channel indices grouped per ADC module, for interleaved sweeps
+        self.modules = {name: getattr(self, name) for name in ADS_ADDRESSES if hasattr(self, name)}
+        self._module_channels = {name: [] for name in self.modules}
+        for i, (_, ads_name, _, _) in enumerate(CHANNELS):
+            self._module_channels[ads_name].append((i, self.channels[i][1]))
 
+        self._pool = None
+        self.configure_sampling(ADS_DATA_RATE, ADS_CONTINUOUS, ADS_INTERLEAVE)
 
-    def _safe_voltage(self, channel, retries=3):
-        for _ in range(retries):
-            try:
-                return channel.voltage
-            except (OSError, IOError):
-                time.sleep(0.05)
-        return None
+    def configure_sampling(self, data_rate=None, continuous=False, interleave=True, modules=None):
+        """
+        Configure how the ADS1115 modules convert.
 
-    def calculate_rs(self, vout):
-        if vout is None or vout <= 0.01:
-            return None
-        return ((self.VC - vout) / vout) * self.RL
+        data_rate   : samples/s per module (one of ADS_DATA_RATES), None keeps the driver default
+        continuous  : continuous-conversion instead of single-shot mode
+        interleave  : sweep the modules concurrently so their conversion times overlap
+                      (the I2C transactions themselves still take turns on the bus)
+        modules     : optional per-module overrides, e.g. {"ads3": {"data_rate": 860, "continuous": True}}
+        """
+        for name, ads in self.modules.items():
+            cfg = (modules or {}).get(name, {})
 
-    def get_ppm(self, rs_ro, sensor):
-        if rs_ro is None:
-            return None
-        try:
-            if sensor == "mq6":
-                return 10 ** (-0.47 * math.log10(rs_ro) + 1.68)
-            elif sensor == "mq135":
-                return 10 ** (-0.42 * math.log10(rs_ro) + 2.3)
-            elif sensor == "mq137":
-                return 10 ** (-0.35 * math.log10(rs_ro) + 1.9)
-        except Exception:
-            return None
-        return None
+            rate = cfg.get("data_rate", data_rate)
+            if rate is not None:
+                if rate not in ADS_DATA_RATES:
+                    raise ValueError(f"Unsupported ADS1115 data rate {rate} (expected one of {ADS_DATA_RATES})")
+                ads.data_rate = rate
 
-    def mems_to_ppm(self, voltage, gas):
-        if voltage is None:
-            return None
-        max_ppm = self.MEMS_MAX_PPM.get(gas, 100)
-        return round((voltage / 5.0) * max_ppm, 2)
+            ads.mode = self.backend.ads_mode(cfg.get("continuous", continuous))
 
+        self.interleave = bool(interleave) and len(self.modules) > 1
+        if self.interleave and self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=len(self.modules), thread_name_prefix="ads")
 
-    def _read_dht(self):
-        for _ in range(3):
+
+    def _safe_voltage(self, channel, retries=3):
+        for _ in range(retries):
             try:
-                t = self.dhtDevice.temperature
-                h = self.dhtDevice.humidity
-                if t is not None and h is not None:
-                    return round(t, 2), round(h, 2)
-            except RuntimeError:
-                time.sleep(0.5)
-        return 0.0, 0.0
+                return channel.voltage
+            except (OSError, IOError):
+                self.clock.sleep(0.05)
+        return None
 
     def _validate_signal(self, voc_readings):
         values = [v for v in voc_readings.values() if v is not None]
@@ -139,47 +176,45 @@ class VOCSensor:
         return True, ""
 
 
-    def read_sensors(self):
+    def read_voltages(self):
+        """
+        Sweep every ADC channel once.
+        Returns a float array in CHANNELS order, NaN where a read failed.
+        """
+        volts = np.full(len(self.channels), np.nan)
+
+        if self.interleave:
+            jobs = [self._pool.submit(self._sweep, chans, volts) for chans in self._module_channels.values()]
+            for job in jobs:
+                job.result()
+        else:
+            self._sweep([(i, chan) for i, (_, chan, _) in enumerate(self.channels)], volts)
+
+        return volts
+
+    def _sweep(self, indexed_channels, volts):
+        for i, chan in indexed_channels:
+            v = self._safe_voltage(chan)
+            if v is not None:
+                volts[i] = v
+
+    def convert(self, voltages):
+        """Convert one sweep of raw voltages to ppm readings keyed by channel label."""
+        ppm = self.calibration.to_ppm(voltages)
+        return {
+            label: (float(p) if np.isfinite(p) else None)
+            for label, p in zip(self.calibration.labels, ppm)
+        }
 
-        voc_readings = {}
+    def process(self, voltages):
+        """
+        Turn one sweep of raw voltages into (status, voc_readings, env_readings),
+        the same contract as read_sensors().
+        """
         env_readings = {}
 
         try:
-            # ---------- MQ ----------
-            mq_list = [
-                ("mq6_1", self.mq6_1, "mq6"),
-                ("mq135_1", self.mq135_1, "mq135"),
-                ("mq137_1", self.mq137_1, "mq137"),
-            ]
-
-            for label, chan, typ in mq_list:
-                v = self._safe_voltage(chan)
-                rs = self.calculate_rs(v)
-                rs_ro = rs / self.RO[typ] if rs is not None else None
-                ppm = self.get_ppm(rs_ro, typ)
-                voc_readings[label] = ppm
-                
-            if SENSOR_MODE == 12:
-                for label, chan, typ in [
-                    ("mq6_2", self.mq6_2, "mq6"),
-                    ("mq135_2", self.mq135_2, "mq135"),
-                    ("mq137_2", self.mq137_2, "mq137")
-                ]:
-                    v = self._safe_voltage(chan)
-                    rs = self.calculate_rs(v)
-                    rs_ro = rs / self.RO[typ] if rs is not None else None
-                    ppm = self.get_ppm(rs_ro, typ)
-                    voc_readings[label] = ppm
-
-            # ---------- MEMS ----------
-            voc_readings["mems_nh3_1"]     = self.mems_to_ppm(self._safe_voltage(self.mems_nh3_1), "nh3")
-            voc_readings["mems_ethanol_1"] = self.mems_to_ppm(self._safe_voltage(self.mems_ethanol_1), "ethanol")
-            voc_readings["mems_odor_1"]    = self.mems_to_ppm(self._safe_voltage(self.mems_odor_1), "odor")
-
-            if SENSOR_MODE == 12:
-                voc_readings["mems_nh3_2"]     = self.mems_to_ppm(self._safe_voltage(self.mems_nh3_2), "nh3")
-                voc_readings["mems_ethanol_2"] = self.mems_to_ppm(self._safe_voltage(self.mems_ethanol_2), "ethanol")
-                voc_readings["mems_odor_2"]    = self.mems_to_ppm(self._safe_voltage(self.mems_odor_2), "odor")
+            voc_readings = self.convert(voltages)
 
             # ---------- Validate ----------
             is_valid, error_msg = self._validate_signal(voc_readings)
@@ -187,9 +222,11 @@ class VOCSensor:
                 return f"ERROR: {error_msg}", {}, {}
 
             # ---------- ENV ----------
-            temp, hum = self._read_dht()
+            # Cached by the DHT sampler thread; never blocks here
+            temp, hum, age = self.dht.latest()
             env_readings["temperature"] = temp
             env_readings["humidity"] = hum
+            env_readings["env_age"] = age
 
             return "OK", voc_readings, env_readings
 
@@ -197,3 +234,13 @@ class VOCSensor:
             err_str = f"Hardware Exception: {str(e)}"
             print(f"[SENSOR ERROR] {err_str}")
             return err_str, {}, {}
+
+    def read_sensors(self):
+        try:
+            voltages = self.read_voltages()
+        except Exception as e:
+            err_str = f"Hardware Exception: {str(e)}"
+            print(f"[SENSOR ERROR] {err_str}")
+            return err_str, {}, {}
+
+        return self.process(voltages)
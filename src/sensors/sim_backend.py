@@ -0,0 +1,498 @@
+"""
+Simulated sensor backend (VOC_BACKEND=sim).
+
+Stands in for the Raspberry Pi: ADC channels are fed from a replayed session
+log or a synthetic generator, GPIO devices live in memory, and every sleep
+runs on a VirtualClock so whole sessions can run faster than real time.
+
+A simple chamber model sits between the data source and the ADC: readings
+rise towards the source values while a hand is present and decay back to
+clean air once it is removed, faster while the flush fan is running.
+
+Environment:
+    VOC_SIM_SOURCE   "synthetic" (default) or a session log path: the
+                     encrypted/plain XML written by database/logger.py or
+                     utils/secure_voc_logger.py, or voc_log.json
+    VOC_SIM_KEY      Fernet key file for encrypted XML logs (default secret.key)
+    VOC_SIM_USER     replay only this user's samples
+    VOC_SIM_SPEED    virtual seconds per real second (default 20)
+    VOC_SIM_RATE     replay rate of logged samples in Hz (default 5)
+    VOC_SIM_HAND     "present" (default) or "absent" at start-up
+"""
+import ast
+import json
+import math
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from sensors.calibration import Calibration, MQ_CURVES, MEMS_MAX_PPM
+from sensors.sensor_reader import CHANNELS, CHANNEL_LABELS, ADS_ADDRESSES
+
+ADS_SINGLE_SHOT = 0x0100
+ADS_CONTINUOUS = 0x0000
+ADS_DEFAULT_DATA_RATE = 128
+I2C_TRANSACTION_TIME = 0.0003   # config write + conversion read at 400 kHz
+
+RISE_TAU = 3.0          # seconds for the chamber to fill once a hand is in
+DECAY_TAU_FAN = 8.0     # seconds to clear with the flush fan running
+DECAY_TAU_IDLE = 60.0   # seconds to clear by diffusion alone
+
+
+# ---------------- CLOCK ----------------
+class VirtualClock:
+    """Clock that runs `speed` virtual seconds per real second."""
+
+    def __init__(self, speed=20.0):
+        self.speed = float(speed)
+        self._real0 = time.monotonic()
+        self._wall0 = time.time()
+
+    def monotonic(self):
+        return (time.monotonic() - self._real0) * self.speed
+
+    def time(self):
+        return self._wall0 + self.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def wait(self, waitable, timeout=None):
+        return waitable.wait(None if timeout is None else timeout / self.speed)
+
+
+# ---------------- DATA SOURCES ----------------
+class ReplaySource:
+    """Replays recorded samples (ppm dicts) at a fixed rate, looping by default."""
+
+    def __init__(self, samples, rate_hz=5.0, loop=True):
+        if not samples:
+            raise ValueError("ReplaySource needs at least one sample")
+        self.samples = samples
+        self.rate_hz = float(rate_hz)
+        self.loop = loop
+
+        self._clean = {}
+        for label in CHANNEL_LABELS:
+            vals = [s[label] for s in samples if s.get(label) is not None]
+            self._clean[label] = float(np.percentile(vals, 5)) if vals else 0.0
+
+    def reading(self, label, t):
+        i = int(t * self.rate_hz)
+        i = i % len(self.samples) if self.loop else min(i, len(self.samples) - 1)
+        return self.samples[i].get(label)
+
+    def clean_air(self, label):
+        return self._clean.get(label, 0.0)
+
+
+class SyntheticSource:
+    """
+    Generates per-user VOC signatures: a log-normal level per channel,
+    a slow breathing-like drift and multiplicative noise.
+    Switch the simulated person with `user`.
+    """
+
+    def __init__(self, n_users=5, seed=0, noise=0.03):
+        rng = np.random.default_rng(seed)
+        self.n_users = n_users
+        self.noise = noise
+        self.user = 0
+
+        self._levels = {}
+        self._phase = {}
+        for label, _, _, typ in CHANNELS:
+            center = 20.0 if typ in MQ_CURVES else 0.2 * MEMS_MAX_PPM.get(typ, 100)
+            self._levels[label] = center * rng.lognormal(0.0, 0.5, size=n_users)
+            self._phase[label] = rng.uniform(0, 2 * math.pi)
+        self._rng = random.Random(seed)
+
+    def reading(self, label, t):
+        base = self._levels[label][self.user % self.n_users]
+        drift = 1.0 + 0.05 * math.sin(2 * math.pi * t / 30.0 + self._phase[label])
+        return base * drift * (1.0 + self._rng.gauss(0.0, self.noise))
+
+    def clean_air(self, label):
+        return 0.25 * float(np.min(self._levels[label]))
+
+
+def load_session_log(path, key_path=None, user_id=None):
+    """Load recorded samples (list of ppm dicts) from an XML or JSON session log."""
+    if path.endswith(".json"):
+        return _load_json_log(path, user_id)
+    return _load_xml_log(path, key_path, user_id)
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def _load_xml_log(path, key_path, user_id):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if not data.lstrip().startswith(b"<"):
+        from cryptography.fernet import Fernet
+        key_path = key_path or os.environ.get("VOC_SIM_KEY", "secret.key")
+        with open(key_path, "rb") as f:
+            data = Fernet(f.read()).decrypt(data)
+
+    samples = []
+    for entry in ET.fromstring(data).findall("entry"):
+        if user_id and (entry.findtext("user_id") or "").strip() != user_id:
+            continue
+
+        # utils/secure_voc_logger.py layout: one <item> per sample dict
+        voc = entry.find("voc")
+        if voc is not None:
+            for item in voc.findall("item"):
+                try:
+                    sample = ast.literal_eval(item.text or "")
+                except (ValueError, SyntaxError):
+                    continue
+                if isinstance(sample, dict):
+                    samples.append(sample)
+            continue
+
+        # database/logger.py layout: one entry per sample, one tag per sensor
+        sample = {elem.tag: _to_float(elem.text) for elem in entry if elem.tag in CHANNEL_LABELS}
+        if sample:
+            samples.append(sample)
+
+    return samples
+
+
+def _load_json_log(path, user_id):
+    samples = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if user_id and entry.get("user_id") != user_id:
+                continue
+            samples.extend(entry.get("samples", []))
+    return samples
+
+
+# ---------------- DEVICES ----------------
+class SimI2C:
+    """Shared bus: transactions from different modules take turns."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def transaction(self):
+        with self._lock:
+            self.clock.sleep(I2C_TRANSACTION_TIME)
+
+
+class SimADS1115:
+    """
+    ADS1115 timing model, following the Adafruit driver: single-shot reads
+    wait one conversion, continuous reads of the same pin return the latest
+    conversion at once, and switching pins in continuous mode waits two
+    conversion periods for the multiplexer to settle.
+    """
+
+    def __init__(self, backend, i2c, address):
+        self.backend = backend
+        self.i2c = i2c
+        self.address = address
+        self.mode = ADS_SINGLE_SHOT
+        self.gain = 1
+        self._data_rate = ADS_DEFAULT_DATA_RATE
+        self._last_pin = None
+        self._lock = threading.Lock()
+
+    @property
+    def data_rate(self):
+        return self._data_rate
+
+    @data_rate.setter
+    def data_rate(self, rate):
+        if rate not in (8, 16, 32, 64, 128, 250, 475, 860):
+            raise ValueError("Data rate must be one of: 8, 16, 32, 64, 128, 250, 475, 860")
+        self._data_rate = rate
+
+    def read(self, pin):
+        with self._lock:
+            period = 1.0 / self._data_rate
+            if self.mode == ADS_CONTINUOUS:
+                if self._last_pin != pin:
+                    self.i2c.transaction()
+                    self.backend.clock.sleep(2 * period)
+            else:
+                self.i2c.transaction()
+                self.backend.clock.sleep(period)
+            self._last_pin = pin
+            self.i2c.transaction()
+            return self.backend.channel_voltage(self.address, pin)
+
+
+class SimAnalogIn:
+    def __init__(self, ads, pin):
+        self.ads = ads
+        self.pin = pin
+
+    @property
+    def voltage(self):
+        return self.ads.read(self.pin)
+
+    @property
+    def value(self):
+        return int(self.voltage / 4.096 * 32767)
+
+
+class SimDHT11:
+    """DHT11 stand-in that fails like the real one now and then."""
+
+    def __init__(self, backend, failure_rate=0.2):
+        self.backend = backend
+        self.failure_rate = failure_rate
+
+    def _read(self, value):
+        if self.backend.rng.random() < self.failure_rate:
+            raise RuntimeError("Checksum did not validate. Try again.")
+        return value
+
+    @property
+    def temperature(self):
+        return self._read(26.0 + self.backend.rng.gauss(0.0, 0.2))
+
+    @property
+    def humidity(self):
+        return self._read(55.0 + self.backend.rng.gauss(0.0, 0.5))
+
+
+class SimDigitalInput:
+    """In-memory gpiozero.DigitalInputDevice with activation callbacks."""
+
+    def __init__(self, pin, pull_up=False, active_state=None, bounce_time=None):
+        self.pin = pin
+        self.bounce_time = bounce_time
+        self.when_activated = None
+        self.when_deactivated = None
+        self._active = False
+
+    @property
+    def is_active(self):
+        return self._active
+
+    @property
+    def value(self):
+        return int(self._active)
+
+    def drive(self, active):
+        """Change the simulated input level, firing callbacks on edges."""
+        active = bool(active)
+        if active == self._active:
+            return
+        self._active = active
+        callback = self.when_activated if active else self.when_deactivated
+        if callback is not None:
+            callback()
+
+    def close(self):
+        pass
+
+
+class SimDigitalOutput:
+    """In-memory gpiozero.DigitalOutputDevice / LED that records every switch."""
+
+    def __init__(self, backend, pin, active_high=True, initial_value=False):
+        self.backend = backend
+        self.pin = pin
+        self.active_high = active_high
+        self._active = bool(initial_value)
+        self.history = [(backend.clock.monotonic(), self._active)]
+
+    def _set(self, active):
+        if active != self._active:
+            self.backend.sync_chamber()
+            self._active = active
+            self.history.append((self.backend.clock.monotonic(), active))
+
+    def on(self):
+        self._set(True)
+
+    def off(self):
+        self._set(False)
+
+    def toggle(self):
+        self._set(not self._active)
+
+    @property
+    def is_active(self):
+        return self._active
+
+    @property
+    def value(self):
+        return int(self._active)
+
+    def close(self):
+        pass
+
+
+class SimFingerprint:
+    """PyFingerprint stand-in; `finger_id` is what searchTemplate() reports (-1 = no match)."""
+
+    def __init__(self, finger_id=0):
+        self.finger_id = finger_id
+        self._stored = 0
+
+    def verifyPassword(self):
+        return True
+
+    def readImage(self):
+        return True
+
+    def convertImage(self, buffer=0x01):
+        return True
+
+    def searchTemplate(self):
+        return self.finger_id, 100 if self.finger_id >= 0 else 0
+
+    def createTemplate(self):
+        return True
+
+    def storeTemplate(self):
+        self._stored += 1
+        return self._stored
+
+    def downloadImage(self, path):
+        from PIL import Image
+        Image.new("L", (256, 288), color=128).save(path)
+
+
+# ---------------- BACKEND ----------------
+class SimulatedBackend:
+    name = "sim"
+
+    def __init__(self, source=None, clock=None, hand_present=True, io_error_rate=0.0, seed=0):
+        self.clock = clock if clock is not None else VirtualClock()
+        self.source = source if source is not None else SyntheticSource(seed=seed)
+        self.rng = random.Random(seed)
+        self.io_error_rate = io_error_rate
+
+        # Logged ppm is turned back into ADC voltages with the default calibration
+        self.calibration = Calibration(CHANNELS)
+        self._channels = {(ADS_ADDRESSES[ads], pin): (i, label) for i, (label, ads, pin, _) in enumerate(CHANNELS)}
+        self.inputs = {}
+        self.outputs = {}
+
+        self._lock = threading.Lock()
+        self._t0 = self.clock.monotonic()
+        self._hand_present = bool(hand_present)
+        self._level = 1.0 if hand_present else 0.0
+        self._level_t = self._t0
+
+    @classmethod
+    def from_env(cls):
+        clock = VirtualClock(float(os.environ.get("VOC_SIM_SPEED", "20")))
+        spec = os.environ.get("VOC_SIM_SOURCE", "synthetic")
+
+        if spec == "synthetic":
+            source = SyntheticSource()
+        else:
+            samples = load_session_log(spec, os.environ.get("VOC_SIM_KEY"), os.environ.get("VOC_SIM_USER"))
+            source = ReplaySource(samples, float(os.environ.get("VOC_SIM_RATE", "5")))
+            print(f"[SIM] Replaying {len(samples)} samples from {spec}")
+
+        hand = os.environ.get("VOC_SIM_HAND", "present") == "present"
+        return cls(source=source, clock=clock, hand_present=hand)
+
+    # ---------- I2C / ADC ----------
+    def i2c(self):
+        return SimI2C(self.clock)
+
+    def ads1115(self, i2c, address):
+        return SimADS1115(self, i2c, address)
+
+    def analog_in(self, ads, pin):
+        return SimAnalogIn(ads, pin)
+
+    def ads_mode(self, continuous):
+        return ADS_CONTINUOUS if continuous else ADS_SINGLE_SHOT
+
+    # ---------- DHT ----------
+    def dht11(self):
+        return SimDHT11(self)
+
+    # ---------- GPIO ----------
+    def digital_input(self, pin, **kwargs):
+        from sensors.hand_controller import IR_PIN
+        dev = SimDigitalInput(pin, **kwargs)
+        if pin == IR_PIN:
+            dev.drive(not self._hand_present)   # IR LOW = hand detected
+        self.inputs[pin] = dev
+        return dev
+
+    def digital_output(self, pin, active_high=True, initial_value=False, **kwargs):
+        dev = SimDigitalOutput(self, pin, active_high, initial_value)
+        self.outputs[pin] = dev
+        return dev
+
+    def led(self, pin):
+        return self.digital_output(pin)
+
+    # ---------- Fingerprint ----------
+    def fingerprint(self):
+        return SimFingerprint()
+
+    # ---------- Scenario control ----------
+    def set_hand_present(self, present):
+        from sensors.hand_controller import IR_PIN
+        self.sync_chamber()
+        self._hand_present = bool(present)
+        ir = self.inputs.get(IR_PIN)
+        if ir is not None:
+            ir.drive(not self._hand_present)
+
+    def fan_running(self):
+        from sensors.fan_controller import FAN_PIN
+        fan = self.outputs.get(FAN_PIN)
+        return fan is not None and fan.is_active
+
+    # ---------- Chamber model ----------
+    def sync_chamber(self):
+        """Advance the chamber fill level to the current virtual time."""
+        with self._lock:
+            now = self.clock.monotonic()
+            dt = now - self._level_t
+            self._level_t = now
+            if dt <= 0:
+                return self._level
+
+            if self._hand_present:
+                target, tau = 1.0, RISE_TAU
+            else:
+                target, tau = 0.0, DECAY_TAU_FAN if self.fan_running() else DECAY_TAU_IDLE
+            self._level += (target - self._level) * (1.0 - math.exp(-dt / tau))
+            return self._level
+
+    def channel_voltage(self, address, pin):
+        if self.io_error_rate and self.rng.random() < self.io_error_rate:
+            raise OSError(121, "Remote I/O error")
+
+        index, label = self._channels.get((address, pin), (None, None))
+        if label is None:
+            return abs(self.rng.gauss(0.0, 0.002))
+
+        level = self.sync_chamber()
+        ppm = self.source.reading(label, self.clock.monotonic() - self._t0)
+        if ppm is None:
+            return float("nan")
+
+        clean = self.source.clean_air(label)
+        return float(self.calibration.to_voltage(clean + (ppm - clean) * level, index))
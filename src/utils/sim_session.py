@@ -0,0 +1,150 @@
+"""
+Headless capture -> feature extraction -> verification run on the simulated backend.
+
+Drives the same acquisition engine, feature extractor and verifier the GUI
+uses, without a Raspberry Pi or a display, and prints how long each stage
+took. Run from src/:
+
+    python -m utils.sim_session --rounds 5 --speed 50
+    python -m utils.sim_session --source ../data/voc_log_encrypted.xml --key utils/secret.key
+    python -m utils.sim_session --sampling --data-rate 860 --continuous
+"""
+import argparse
+import time
+
+from sensors.backend import set_backend
+from sensors.sim_backend import SimulatedBackend, VirtualClock, ReplaySource, SyntheticSource, load_session_log
+
+
+def build_backend(source=None, key=None, user=None, speed=20.0, rate=5.0, seed=0):
+    if source:
+        samples = load_session_log(source, key, user)
+        data = ReplaySource(samples, rate)
+        print(f"[SIM] Replaying {len(samples)} samples from {source}")
+    else:
+        data = SyntheticSource(seed=seed)
+    # Start with an empty chamber; run_session() places the hand
+    return set_backend(SimulatedBackend(source=data, clock=VirtualClock(speed), hand_present=False, seed=seed))
+
+
+def benchmark_sampling(duration=10.0, data_rate=None, continuous=False, interleave=True):
+    """Free-run the acquisition engine for `duration` virtual seconds and report samples/s per channel."""
+    from sensors.acquisition import AcquisitionEngine
+
+    engine = AcquisitionEngine(rate_hz=0)
+    engine.sensor.configure_sampling(data_rate, continuous, interleave)
+    engine.start()
+    engine.clock.sleep(duration)
+    engine.stop()
+
+    rates = engine.sample_rates()
+    mode = "continuous" if continuous else "single-shot"
+    print(f"[SIM] ADS1115 {data_rate or 'default'} SPS, {mode}, interleave={interleave}: "
+          f"{engine.count} sweeps in {duration:.1f}s")
+    for label, sps in rates.items():
+        print(f"  {label:16s} {sps:8.1f} samples/s")
+    return rates
+
+
+def run_session(rounds=5, sample_count=30, verify=True, sequential=False):
+    # Imported here so the simulated backend is installed before any driver is built
+    from sensors.acquisition import get_acquisition
+    from sensors.flush_controller import get_flush_controller
+    from sensors.hand_controller import HandController
+    from core.online_features import OnlineFeatureAccumulator
+
+    engine = get_acquisition()
+    sensor = engine.sensor
+    hand = HandController(sensor.backend)
+    engine.start()
+
+    # Record the idle chamber as the clean-air baseline before the hand goes in
+    backend = sensor.backend
+    engine.clock.sleep(5.0)
+    get_flush_controller().ensure_baseline()
+    backend.set_hand_present(True)
+    hand.wait_for_hand()
+
+    timings = {"capture": 0.0, "features": 0.0, "verify": 0.0, "flush": 0.0}
+    chunks = []
+    seq = None
+    if verify and sequential:
+        from core.sequential import SequentialVerifier
+        seq = SequentialVerifier(rounds)
+    try:
+        blocks = engine.iter_blocks(sample_count, gate=hand)
+        for r in range(1, rounds + 1):
+            t0 = time.perf_counter()
+            _, values = next(blocks)
+            acc = OnlineFeatureAccumulator(engine.labels)
+            t_feat = 0.0
+            for row in values:
+                status, voc, _ = sensor.process(row)
+                if status == "OK":
+                    t1 = time.perf_counter()
+                    acc.add(voc)
+                    t_feat += time.perf_counter() - t1
+
+            t1 = time.perf_counter()
+            if len(acc):
+                chunks.append(acc.snapshot_dict())
+            t_feat += time.perf_counter() - t1
+
+            timings["capture"] += time.perf_counter() - t0 - t_feat
+            timings["features"] += t_feat
+            print(f"[SIM] Round {r}/{rounds}: {len(acc)}/{sample_count} valid samples")
+
+            if seq is not None and chunks and len(acc):
+                t0 = time.perf_counter()
+                decision = seq.add_round(chunks[-1])
+                timings["verify"] += time.perf_counter() - t0
+                if decision != "continue":
+                    print(f"[SIM] Early {decision} after round {r}")
+                    break
+
+        result = None
+        backend.set_hand_present(False)
+        if verify and chunks:
+            from core.verification_controller import verify_user
+            t0 = time.perf_counter()
+            result = seq.finish() if seq is not None else verify_user(chunks)
+            timings["verify"] += time.perf_counter() - t0
+            print(f"[SIM] Result: {result['status']} {result['user_name']} ({result['confidence']}%)")
+
+            # The flush queued by verification runs in the background; the engine must outlive it
+            from sensors.fan_scheduler import get_fan_scheduler
+            t0 = time.perf_counter()
+            get_fan_scheduler().wait_until_clean()
+            timings["flush"] = time.perf_counter() - t0
+    finally:
+        engine.stop()
+
+    print("[SIM] Wall time per stage:")
+    for stage, secs in timings.items():
+        print(f"  {stage:10s} {secs * 1000:10.1f} ms")
+    return result, timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a simulated VOC session end to end.")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--samples", type=int, default=30)
+    parser.add_argument("--speed", type=float, default=20.0, help="virtual seconds per real second")
+    parser.add_argument("--rate", type=float, default=5.0, help="replay rate of logged samples (Hz)")
+    parser.add_argument("--source", help="session log to replay (default: synthetic)")
+    parser.add_argument("--key", help="Fernet key for an encrypted XML log")
+    parser.add_argument("--user", help="replay only this user's samples")
+    parser.add_argument("--no-verify", action="store_true")
+    parser.add_argument("--sequential", action="store_true", help="stop once the verification decision is clear")
+    parser.add_argument("--sampling", action="store_true", help="benchmark ADC sampling rates instead")
+    parser.add_argument("--data-rate", type=int, help="ADS1115 data rate for --sampling")
+    parser.add_argument("--continuous", action="store_true", help="continuous conversion for --sampling")
+    parser.add_argument("--no-interleave", action="store_true", help="sweep the modules one after another")
+    args = parser.parse_args()
+
+    build_backend(args.source, args.key, args.user, args.speed, args.rate)
+    if args.sampling:
+        benchmark_sampling(data_rate=args.data_rate, continuous=args.continuous,
+                           interleave=not args.no_interleave)
+    else:
+        run_session(args.rounds, args.samples, verify=not args.no_verify, sequential=args.sequential)
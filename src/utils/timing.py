@@ -0,0 +1,181 @@
+"""
+Lightweight latency instrumentation.
+
+    with span("features"):
+        ...
+
+times a block, adds it to a rolling window of samples for that stage
+(percentiles() gives p50/p95/p99 over the last HISTORY samples) and, when
+a Timeline is active on the current thread, to that timeline. A capture
+session activates one Timeline; verification attaches its as_dict() to the
+result as result["timings"]: total ms per stage, per ensemble member and
+per round. Spans may nest (inference runs inside "verify"); each stage's
+total is its own wall time.
+
+With VOC_TIMINGS=0, span() returns a shared no-op object and @timed leaves
+functions undecorated, so disabled instrumentation costs one call.
+"""
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+TIMINGS_ENABLED = os.environ.get("VOC_TIMINGS", "1") != "0"
+HISTORY = 512       # samples kept per stage for the rolling percentiles
+
+_history = {}
+_history_lock = threading.Lock()
+_local = threading.local()
+
+
+# ---------------- TIMELINE ----------------
+class Timeline:
+    """Per-session breakdown: stages, ensemble members and rounds, all in ms."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.models = {}
+        self.rounds = []
+
+    def next_round(self, number):
+        """Spans from now on are also booked to round `number`."""
+        self.rounds.append({"round": number})
+
+    def add(self, stage, ms):
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+        if self.rounds:
+            current = self.rounds[-1]
+            current[stage] = current.get(stage, 0.0) + ms
+
+    def add_models(self, member_ms):
+        for name, ms in member_ms.items():
+            self.models[name] = self.models.get(name, 0.0) + ms
+
+    def as_dict(self):
+        def rounded(d):
+            return {k: round(v, 3) if isinstance(v, float) else v for k, v in d.items()}
+
+        return {
+            "total": round((time.perf_counter() - self.started) * 1000, 3),
+            "stages": rounded(self.stages),
+            "models": rounded(self.models),
+            "rounds": [rounded(r) for r in self.rounds],
+        }
+
+
+def current_timeline():
+    return getattr(_local, "timeline", None)
+
+
+@contextmanager
+def activate(timeline):
+    """Book spans on this thread to `timeline` for the duration of the block."""
+    previous = current_timeline()
+    _local.timeline = timeline
+    try:
+        yield timeline
+    finally:
+        _local.timeline = previous
+
+
+# ---------------- SPANS ----------------
+def _window(stage):
+    window = _history.get(stage)
+    if window is None:
+        with _history_lock:
+            window = _history.setdefault(stage, deque(maxlen=HISTORY))
+    return window
+
+
+def record(stage, ms):
+    _window(stage).append(ms)
+    timeline = current_timeline()
+    if timeline is not None:
+        timeline.add(stage, ms)
+
+
+def record_models(member_ms):
+    """Per-member inference times from the ensemble executor."""
+    if not TIMINGS_ENABLED:
+        return
+    for name, ms in member_ms.items():
+        _window(f"model.{name}").append(ms)
+    timeline = current_timeline()
+    if timeline is not None:
+        timeline.add_models(member_ms)
+
+
+class _Span:
+    __slots__ = ("stage", "t0", "ms")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.ms = 0.0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self.t0) * 1000
+        record(self.stage, self.ms)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+    ms = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    return _Span(stage) if TIMINGS_ENABLED else _NULL_SPAN
+
+
+def timed(stage):
+    """Decorator form of span(); a no-op (the function itself) when timings are disabled."""
+    def decorate(func):
+        if not TIMINGS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+    return decorate
+
+
+# ---------------- PERCENTILES ----------------
+def percentiles(stages=None):
+    """{stage: {"n", "p50", "p95", "p99"}} over each stage's rolling window (ms)."""
+    with _history_lock:
+        windows = {stage: list(window) for stage, window in _history.items()
+                   if stages is None or stage in stages}
+    summary = {}
+    for stage, samples in sorted(windows.items()):
+        if not samples:
+            continue
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        summary[stage] = {"n": len(samples), "p50": round(float(p50), 3),
+                          "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+    return summary
+
+
+def reset():
+    with _history_lock:
+        _history.clear()
@@ -1,3 +1,4 @@
+import copy
 import os
 import sys
 import pandas as pd
@@ -8,10 +9,210 @@ from sklearn.tree import DecisionTreeClassifier
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.model_selection import StratifiedKFold, cross_val_score, train_test_split
 from sklearn.neural_network import MLPClassifier
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import classification_report, confusion_matrix
 from xgboost import XGBClassifier
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from core.numpy_runtime import CompiledBoostedTrees, CompiledTrees, NumpyMLP, save_metadata  # noqa: E402
+from core.model_registry import begin_bundle, write_bundle_manifest  # noqa: E402
+from core.embedding import (EMBEDDING_DIM, EMBEDDING_FILE, RADIUS_PERCENTILE,  # noqa: E402
+                            EmbeddingModel, compile_projection)
+
+
+ONNX_MEMBERS = ("rf_model", "et_model", "dt_model", "xgb_model", "ann_model")
+ONNX_TOLERANCE = 1e-3   # max |p_onnx - p_sklearn| accepted on the check set
+NUMPY_MEMBERS = ("rf_model", "et_model", "dt_model", "xgb_model", "ann_model")
+# Max |p_numpy - p_sklearn| accepted on the check set: sklearn trees exactly, XGBoost up to its
+# float32 margins, the float32 ANN a little more
+NUMPY_TOLERANCE = {"rf_model": 0.0, "et_model": 0.0, "dt_model": 0.0, "xgb_model": 1e-5, "ann_model": 1e-4}
+
+
+def _discard(path):
+    """Remove an export left by an earlier run, so the registry serves the pickle just written."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _to_onnx(name, model, n_features):
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+
+    initial_types = [("input", FloatTensorType([None, n_features]))]
+
+    if name == "xgb_model":
+        # XGBoost needs onnxmltools' converter; without it XGB stays on the pickle
+        from onnxmltools import convert_xgboost
+        return convert_xgboost(model, initial_types=initial_types)
+
+    # Probabilities as a plain tensor instead of a list of {class: prob} maps
+    classifier = model.steps[-1][1] if isinstance(model, Pipeline) else model
+    return convert_sklearn(model, initial_types=initial_types, options={id(classifier): {"zipmap": False}})
+
+
+def export_onnx(models, scaler, n_features, output_dir, X_check=None):
+    """
+    Write <name>.onnx next to each pickle. The ANN is exported as a
+    scaler + MLP pipeline so it takes raw features like the tree models.
+    Each graph is checked against the sklearn model on X_check before it is
+    written; a member that fails to convert or disagrees keeps only its pickle
+    (and loses any .onnx from an earlier run).
+    """
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("[ONNX] onnxruntime not installed — skipping ONNX export")
+        for name in ONNX_MEMBERS:
+            _discard(os.path.join(output_dir, f"{name}.onnx"))
+        return []
+
+    exported = []
+    for name in ONNX_MEMBERS:
+        model = models[name]
+        if name == "ann_model":
+            model = Pipeline([("scaler", scaler), ("ann", model)])
+        path = os.path.join(output_dir, f"{name}.onnx")
+
+        try:
+            onx = _to_onnx(name, model, n_features)
+        except ImportError as e:
+            print(f"[ONNX] {name}: converter unavailable ({e}) — keeping pickle only")
+            _discard(path)
+            continue
+        except Exception as e:
+            print(f"[ONNX] {name}: conversion failed ({e}) — keeping pickle only")
+            _discard(path)
+            continue
+
+        payload = onx.SerializeToString()
+        if X_check is not None and len(X_check):
+            session = ort.InferenceSession(payload, providers=["CPUExecutionProvider"])
+            X32 = np.asarray(X_check, dtype=np.float32)
+            probs = session.run(None, {session.get_inputs()[0].name: X32})[1]
+            err = float(np.max(np.abs(np.asarray(probs) - model.predict_proba(np.asarray(X_check)))))
+            if err > ONNX_TOLERANCE:
+                print(f"[ONNX] {name}: max probability error {err:.2e} — keeping pickle only")
+                _discard(path)
+                continue
+            print(f"[ONNX] {name}: max probability error {err:.2e}")
+
+        with open(path, "wb") as f:
+            f.write(payload)
+        exported.append(name)
+        print(f"  Saved → {path}")
+
+    return exported
+
+
+def _compile_numpy(name, model, scaler):
+    if name == "ann_model":
+        return NumpyMLP.from_model(model, scaler)
+    if name == "xgb_model":
+        return CompiledBoostedTrees.from_model(model)
+    return CompiledTrees.from_model(model)
+
+
+def _numpy_error(name, compiled, model, scaler, X):
+    """Max |p_numpy - p_sklearn| on X; compiled sklearn trees must match exactly (else inf)."""
+    if name == "ann_model":
+        return float(np.max(np.abs(compiled.predict_proba(X) - model.predict_proba(scaler.transform(X)))))
+    if name == "xgb_model":
+        return float(np.max(np.abs(compiled.predict_proba(X) - model.predict_proba(X))))
+    # Threaded forests may add trees in any order; compare against a single-threaded run
+    reference = model
+    if getattr(model, "n_jobs", None) not in (None, 1):
+        reference = copy.copy(model)
+        reference.n_jobs = 1
+    return 0.0 if np.array_equal(compiled.predict_proba(X), reference.predict_proba(X)) else float("inf")
+
+
+def export_numpy(models, scaler, output_dir, X_check=None):
+    """
+    Compile every member into <name>.npz for the NumPy runtime. Compiled
+    sklearn trees must reproduce predict_proba exactly on X_check, XGBoost
+    and the float32 ANN (scaler folded in) to within their tolerances; a
+    member that fails to compile or disagrees keeps only its pickle (and
+    loses any .npz from an earlier run).
+    """
+    exported = []
+    for name in NUMPY_MEMBERS:
+        path = os.path.join(output_dir, f"{name}.npz")
+        try:
+            compiled = _compile_numpy(name, models[name], scaler)
+            if X_check is not None and len(X_check):
+                err = _numpy_error(name, compiled, models[name], scaler, np.asarray(X_check))
+                if err > NUMPY_TOLERANCE[name]:
+                    print(f"[NUMPY] {name}: max probability error {err:.2e} — keeping pickle only")
+                    _discard(path)
+                    continue
+                print(f"[NUMPY] {name}: max probability error {err:.2e}")
+            compiled.save(path)
+        except Exception as e:
+            print(f"[NUMPY] {name}: compilation failed ({e}) — keeping pickle only")
+            _discard(path)
+            continue
+        exported.append(name)
+        print(f"  Saved → {path}")
+
+    return exported
+
+
+def train_embedding(X_train, y_train, X_test, y_test, scaler, feature_order, output_dir):
+    """
+    Fit the discriminant projection for the embedding index on the scaled
+    training rows and write it (scaler folded in) as embedding_model.npz.
+    The open-set radius is a percentile of held-out distances to the own
+    user's training centroid.
+    """
+    path = os.path.join(output_dir, EMBEDDING_FILE)
+    n_components = min(EMBEDDING_DIM, len(np.unique(y_train)) - 1, X_train.shape[1])
+    if n_components < 1:
+        print("[EMBEDDING] Need at least two users — skipping")
+        # A projection from an earlier run would not match the members trained now
+        _discard(path)
+        return None
+
+    lda = LinearDiscriminantAnalysis(solver="eigen", shrinkage="auto")
+    lda.fit(scaler.transform(X_train), y_train)
+    W, b = compile_projection(lda, scaler, n_components)
+    model = EmbeddingModel({"W": W, "b": b, "radius": np.asarray(0.0)})
+
+    Z_train, Z_test = model.transform(np.asarray(X_train)), model.transform(np.asarray(X_test))
+    classes = np.unique(y_train)
+    centroids = np.vstack([Z_train[y_train == c].mean(axis=0) for c in classes])
+    dist = np.linalg.norm(Z_test[:, None, :] - centroids[None], axis=2)
+    own = dist[np.arange(len(y_test)), np.searchsorted(classes, y_test)]
+    radius = float(np.percentile(own, RADIUS_PERCENTILE))
+    accuracy = float((classes[dist.argmin(axis=1)] == y_test).mean())
+    print(f"  Dimensions: {n_components}  Nearest-centroid Acc: {accuracy:.4f}  Radius: {radius:.3f}")
+
+    EmbeddingModel.save(path, W, b, radius, feature_order)
+    print(f"  Saved → {path}")
+    return path
+
+
+def export_from_pickles(sensor_mode):
+    """Write the NumPy and ONNX exports for the pickles of an existing training run without retraining."""
+    output_dir = os.path.join("models", f"{sensor_mode}_sensors")
+    models = {name: joblib.load(os.path.join(output_dir, f"{name}.pkl")) for name in ONNX_MEMBERS}
+    scaler = joblib.load(os.path.join(output_dir, "ann_scaler.pkl"))
+    feature_order = joblib.load(os.path.join(output_dir, "feature_order.pkl"))
+    le = joblib.load(os.path.join(output_dir, "label_encoder.pkl"))
+    training_id = begin_bundle(output_dir)
+    save_metadata(output_dir, le.classes_, feature_order)
+
+    # Synthetic check set spread around the scaler's training distribution
+    rng = np.random.default_rng(42)
+    X_check = scaler.mean_ + rng.standard_normal((256, len(feature_order))) * scaler.scale_
+    print("[NUMPY] Compiling models")
+    exported = export_numpy(models, scaler, output_dir, X_check)
+    print("[ONNX] Exporting inference graphs")
+    exported += export_onnx(models, scaler, len(feature_order), output_dir, X_check)
+    manifest = write_bundle_manifest(output_dir, training_id)
+    print(f"[MANIFEST] Bundle {manifest['training_id']}: {len(manifest['files'])} files")
+    return exported
+
 
 def train_ensemble(csv_path, sensor_mode):
     print(f"[LOG] Training cycle initiated for SENSOR_MODE: {sensor_mode}")
@@ -74,6 +275,9 @@ def train_ensemble(csv_path, sensor_mode):
 
     output_dir = os.path.join("models", f"{sensor_mode}_sensors")
     os.makedirs(output_dir, exist_ok=True)
+    # Invalidate the previous manifest before any artifact is overwritten; the app keeps serving
+    # the bundle it has loaded until the manifest below completes this run
+    training_id = begin_bundle(output_dir)
 
     skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
 
@@ -130,6 +334,7 @@ def train_ensemble(csv_path, sensor_mode):
     }
 
     results = {}
+    trained = {}
 
     for name, model in models_to_train.items():
         print(f"\n[TRAIN] {name}")
@@ -160,6 +365,7 @@ def train_ensemble(csv_path, sensor_mode):
               f"{classification_report(y_test, y_pred, target_names=[str(c) for c in le.classes_])}")
 
         results[name] = {"cv_mean": cv_scores.mean(), "test_acc": test_acc}
+        trained[name] = model
 
         export_path = os.path.join(output_dir, f"{name}.pkl")
         joblib.dump(model, export_path)
@@ -169,6 +375,21 @@ def train_ensemble(csv_path, sensor_mode):
     joblib.dump(scaler, os.path.join(output_dir, "ann_scaler.pkl"))
     joblib.dump(le, os.path.join(output_dir, "label_encoder.pkl"))
     joblib.dump(feature_order, os.path.join(output_dir, "feature_order.pkl"))
+    save_metadata(output_dir, le.classes_, feature_order)
+
+    # ── Embedding projection (open-set identification) ──────────────────────
+    print("\n[EMBEDDING] Fitting projection")
+    train_embedding(X_train.values, y_train, X_test.values, y_test, scaler, feature_order, output_dir)
+
+    # ── Inference exports (verification prefers these when present) ─────────
+    print("\n[NUMPY] Compiling models")
+    export_numpy(trained, scaler, output_dir, X_check=X_test.values)
+    print("\n[ONNX] Exporting inference graphs")
+    export_onnx(trained, scaler, len(feature_order), output_dir, X_check=X_test.values)
+
+    # ── Manifest last: the app reloads only once every artifact above is in place ──
+    manifest = write_bundle_manifest(output_dir, training_id)
+    print(f"\n[MANIFEST] Bundle {manifest['training_id']}: {len(manifest['files'])} files")
 
     # ── Summary ──────────────────────────────────────────────────────────────
     print("\n[SUMMARY]")
@@ -182,9 +403,13 @@ def train_ensemble(csv_path, sensor_mode):
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python train_all.py <sensor_mode>")
+        print("Usage: python train_all.py <sensor_mode> [--export-only]")
         sys.exit(1)
 
     mode = sys.argv[1]
+    if {"--export-only", "--onnx-only"} & set(sys.argv[2:]):
+        export_from_pickles(mode)
+        sys.exit(0)
+
     csv_file = os.path.join(os.path.dirname(__file__), "training_data.csv")
     train_ensemble(csv_file, mode)
\ No newline at end of file